@@ -1,16 +1,78 @@
+import time
+STARTUP_T0 = time.perf_counter()
+
 import streamlit as st
-import pandas as pd
-import datetime
+from streamlit import runtime
+import streamlit.components.v1 as components
+import argparse
 import calendar
-import time
-import gspread
-import extra_streamlit_components as stx
-from oauth2client.service_account import ServiceAccountCredentials
-from korean_lunar_calendar import KoreanLunarCalendar
+import collections
+import datetime
+import hashlib
+import html
+import importlib
+import importlib.util
+import io
+import json
+import math
+import os
+import pickle
+import re
+import sys
+import tempfile
+import threading
+
+# --- [시작 속도] 무거운 모듈은 처음 쓰일 때 불러옴 (로그인 화면은 streamlit만 필요) ---
+STARTUP_TIMINGS = {}
+
+def mark_timing(label):
+    STARTUP_TIMINGS.setdefault(label, time.perf_counter() - STARTUP_T0)
+
+class LazyModule:
+    """속성에 처음 접근하거나 호출할 때 import 되는 모듈 대리 객체"""
+    def __init__(self, module_name, attr_name=None, on_load=None):
+        self._module_name = module_name
+        self._attr_name = attr_name
+        self._on_load = on_load
+        self._target = None
+
+    def _load(self):
+        if self._target is None:
+            t0 = time.perf_counter()
+            module = importlib.import_module(self._module_name)
+            if self._on_load: self._on_load(module)
+            self._target = getattr(module, self._attr_name) if self._attr_name else module
+            STARTUP_TIMINGS.setdefault(f"import {self._module_name}", time.perf_counter() - t0)
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+def configure_pandas(pandas):
+    # 공유 DataFrame(load_data)을 세션끼리 안전하게 나눠 쓰기 위해 프로세스 전체를 copy-on-write로 (pandas를 처음 쓰기 전에 한 번)
+    try: pandas.set_option("mode.copy_on_write", True)
+    except Exception: pass
+
+pd = LazyModule("pandas", on_load=configure_pandas)
+gspread = LazyModule("gspread")
+stx = LazyModule("extra_streamlit_components")
+ServiceAccountCredentials = LazyModule("oauth2client.service_account", "ServiceAccountCredentials")
+KoreanLunarCalendar = LazyModule("korean_lunar_calendar", "KoreanLunarCalendar")
 
 # --- [설정] 구글 시트 파일 이름 ---
 SHEET_NAME = "교회출석데이터"
 
+# --- [설정] 구글 API 분당 호출 한도 (프로세스 전체 공유) ---
+READ_QUOTA_PER_MIN = 60
+WRITE_QUOTA_PER_MIN = 60
+QUOTA_MAX_WAIT = 3          # 읽기: 한도 임박 시 최대 대기(초), 넘으면 이전 데이터 사용
+QUOTA_MAX_WAIT_WRITE = 20   # 쓰기: 저장은 대체할 데이터가 없으므로 더 오래 기다림
+DATA_TTL = 60               # 한 번 받아온 데이터를 모든 사용자가 공유하는 시간(초)
+STALE_RETRY_SECONDS = 15    # 받아오기에 실패하면 이 시간 동안은 이전 데이터를 쓰고 다시 시도
+
 # --- [설정] 부서별 표시할 모임 정의 ---
 COLS_ADULT = ["주일 1부", "주일 2부", "주일 오후", "소그룹 모임"]
 COLS_YOUTH = ["중고등부", "주일 1부", "주일 2부", "주일 오후"]
@@ -27,14 +89,96 @@ MEETING_CONFIG = {
     4: ["금요철야"]  # 금요일
 }
 
+# 탭별 기본 컬럼
+EXPECTED_COLS = {
+    "members": ["이름", "성별", "생일", "음력", "전화번호", "주소", "가족ID", "소그룹", "비고"],
+    "attendance_log": ["날짜", "모임명", "이름", "소그룹", "출석여부"],
+    "users": ["아이디", "비밀번호", "이름", "역할", "담당소그룹"],
+    "prayer_log": ["날짜", "이름", "소그룹", "내용", "작성자"],
+    "notices": ["날짜", "내용", "작성자"],
+    "reports": ["날짜", "작성자", "내용", "답변"]
+}
+
 # 통계용 전체 컬럼 순서
 ALL_MEETINGS_ORDERED = ["주일 1부", "주일 2부", "주일 오후", "주일학교", "중고등부", "청년부", "소그룹 모임", "수요예배", "금요철야"]
 
+# --- [설정] 여러 교회 운영 (멀티 테넌트) ---
+# secrets.toml 에 [tenants.<교회코드>] 를 두면 한 서버에서 여러 교회를 운영함 (없으면 기존처럼 한 교회)
+# 교회는 URL(?church=<교회코드>) 또는 로그인 화면의 '교회 선택'으로 정해짐
+#   [tenants.hoejung]
+#   name = "회정교회"
+#   sheet_name = "교회출석데이터"
+#   credentials = "gcp_service_account"        # secrets 안의 서비스 계정 항목 이름
+#   [tenants.hoejung.meetings]                  # (선택) 모임 구성
+#   adult = ["주일 1부", "주일 2부", "주일 오후", "소그룹 모임"]
+#   weekday = { "2" = ["수요예배"], "4" = ["금요철야"] }
+DEFAULT_TENANT = "default"
+MAX_ACTIVE_TENANTS = 24         # 서버에 상태를 유지할 최대 교회 수 (넘으면 가장 오래 안 쓴 교회부터 정리)
+TENANT_IDLE_SECONDS = 30 * 60   # 이 시간 동안 접속이 없는 교회의 보관 데이터/색인은 정리
+CLIENT_POOL_SIZE = 8            # 동시에 유지할 구글 인증 클라이언트 수
+
+@st.cache_resource(show_spinner=False)
+def get_tenant_registry():
+    """교회코드 -> 설정"""
+    default = {"name": "회정교회", "sheet_name": SHEET_NAME, "credentials": "gcp_service_account", "meetings": {}}
+    try: tenants = st.secrets.get("tenants")
+    except Exception: tenants = None
+    if not tenants: return {DEFAULT_TENANT: default}
+    # 여러 교회를 운영할 때는 다른 교회의 시트를 잘못 쓰지 않도록 기본값으로 채우지 않고 반드시 적게 함
+    missing = [f"[tenants.{tid}] {key}" for tid, cfg in tenants.items() for key in ("name", "sheet_name", "credentials") if not dict(cfg).get(key)]
+    if missing:
+        message = f"교회 설정 오류: secrets.toml 에 다음 항목이 없습니다 - {', '.join(missing)}"
+        if runtime.exists(): st.error(message); st.stop()
+        raise SystemExit(message)
+    return {str(tid): {"meetings": {}, **dict(cfg)} for tid, cfg in tenants.items()}
+
+TENANT_OVERRIDE = None  # 명령줄 작업에서 대상 교회를 지정할 때 사용
+
+def current_tenant_id():
+    registry = get_tenant_registry()
+    tid = TENANT_OVERRIDE or st.session_state.get("tenant_id")
+    return tid if tid in registry else next(iter(registry))
+
+def get_tenant_config():
+    return get_tenant_registry()[current_tenant_id()]
+
+def resolve_tenant():
+    """URL > 세션 순으로 교회를 정함. 로그인한 채로 교회가 바뀌면 로그인을 해제"""
+    registry = get_tenant_registry()
+    requested = st.query_params.get("church")
+    tid = requested if requested in registry else st.session_state.get("tenant_id")
+    if tid not in registry: tid = next(iter(registry))
+    if st.session_state.get("tenant_id") not in (None, tid):
+        st.session_state["logged_in"] = False
+        st.session_state["user_info"] = None
+    st.session_state["tenant_id"] = tid
+    return tid
+
+def login_cookie_name():
+    # 교회가 하나뿐이면 기존 쿠키 이름을 그대로 사용
+    if len(get_tenant_registry()) == 1: return "church_user_id"
+    return f"church_user_id_{current_tenant_id()}"
+
+def get_meeting_config():
+    """현재 교회의 모임 구성 (설정이 없으면 기본 모임)"""
+    m = get_tenant_config().get("meetings") or {}
+    if not m:
+        return {"adult": COLS_ADULT, "youth": COLS_YOUTH, "young": COLS_YOUNG, "kids": COLS_KIDS,
+                "sunday_all": SUNDAY_ALL, "weekday": MEETING_CONFIG, "ordered": ALL_MEETINGS_ORDERED}
+    cfg = {k: list(m.get(k, default)) for k, default in [("adult", COLS_ADULT), ("youth", COLS_YOUTH), ("young", COLS_YOUNG), ("kids", COLS_KIDS)]}
+    cfg["sunday_all"] = list(dict.fromkeys(cfg["adult"] + cfg["youth"] + cfg["young"] + cfg["kids"]))
+    weekday_extra = {int(k): list(v) for k, v in dict(m.get("weekday", {2: ["수요예배"], 4: ["금요철야"]})).items()}
+    cfg["weekday"] = {6: cfg["sunday_all"], **weekday_extra}
+    cfg["ordered"] = list(m.get("ordered", cfg["sunday_all"] + [c for cols in weekday_extra.values() for c in cols]))
+    return cfg
+
+if runtime.exists(): resolve_tenant()
+
 # 페이지 기본 설정
-st.set_page_config(page_title="회정교회 출석부 v3.3", layout="wide", initial_sidebar_state="collapsed")
+st.set_page_config(page_title=f"{get_tenant_config()['name']} 출석부 v3.3", layout="wide", initial_sidebar_state="collapsed")
 
 # --- [스타일] CSS 적용 ---
-st.markdown("""
+BASE_CSS = """
     <style>
     html, body, p, li, .stMarkdown { font-size: 18px !important; }
     h1 { 
@@ -96,80 +240,381 @@ st.markdown("""
         .b-badge, .lunar-badge { font-size: 11px; margin-top: 2px; }
     }
     </style>
-    """, unsafe_allow_html=True)
+    """
 
-# --- 1. 구글 시트 연결 ---
 @st.cache_resource
+def get_base_css():
+    # 공백을 줄여 한 번만 만들어 두고 매 실행마다 재사용
+    css = re.sub(r"\s+", " ", BASE_CSS)
+    return re.sub(r"\s*([{};:,])\s*", r"\1", css).strip()
+
+st.markdown(get_base_css(), unsafe_allow_html=True)
+
+# --- 1. 구글 시트 연결 ---
+def authorize_client(credentials_key):
+    creds_dict = st.secrets[credentials_key]
+    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
+    return gspread.authorize(creds)
+
+class SheetError(Exception):
+    """명령줄 작업에서 시트 연결/읽기 실패 원인을 그대로 전달하기 위한 예외"""
+
+def sheet_error(message, show=True):
+    # 화면에서는 오류 상자로(또는 조용히) 넘어가고, 명령줄에서는 st.error가 아무것도 하지 않으므로 예외로 올림
+    if not runtime.exists(): raise SheetError(message)
+    if show: st.error(message)
+
 def get_google_sheet_client():
     try:
-        creds_dict = st.secrets["gcp_service_account"]
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-        return client
+        return get_tenant_pool().client(get_tenant_config()["credentials"])
     except Exception as e:
-        st.error(f"구글 연결 설정 오류: Secrets를 확인해주세요. ({e})")
+        sheet_error(f"구글 연결 설정 오류: Secrets를 확인해주세요. ({e})")
+        return None
+
+# --- 1-1. API 호출 한도 관리 (토큰 버킷) ---
+class TokenBucket:
+    """분당 한도를 초당 비율로 채워 넣는 토큰 버킷"""
+    def __init__(self, capacity, per_seconds=60):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, n=1):
+        """성공하면 0, 실패하면 토큰이 찰 때까지 필요한 대기 시간(초)을 반환"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= n:
+                self.tokens -= n
+                return 0
+            return (n - self.tokens) / self.rate
+
+    def drain(self):
+        with self.lock:
+            self._refill()
+            self.tokens = 0.0
+
+    def remaining(self):
+        with self.lock:
+            self._refill()
+            return int(self.tokens)
+
+def new_quota_buckets():
+    return {"read": TokenBucket(READ_QUOTA_PER_MIN), "write": TokenBucket(WRITE_QUOTA_PER_MIN)}
+
+class RequestBudget:
+    """모든 세션이 공유하는 읽기/쓰기 예산 + 마지막 정상 데이터 보관소"""
+    def __init__(self, buckets=None, sheet_locks=None):
+        self.buckets = buckets or new_quota_buckets()
+        self.lock = threading.Lock()
+        self.sheet_locks = sheet_locks if sheet_locks is not None else {}
+        self.worksheets = {}
+        self.stale = {}
+        self.stats = {"throttled": 0, "stale_served": 0, "api_errors": 0}
+
+    def acquire(self, kind, n=1, max_wait=QUOTA_MAX_WAIT):
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.buckets[kind].try_acquire(n)
+            if wait == 0: return True
+            if time.monotonic() + wait > deadline:
+                self.stats["throttled"] += 1
+                return False
+            time.sleep(wait)
+
+    def penalize(self, kind):
+        # 구글이 한도 초과(429)를 알려오면 버킷을 비워 다른 세션도 잠시 쉬게 함
+        self.stats["api_errors"] += 1
+        self.buckets[kind].drain()
+
+    def remaining(self, kind):
+        return self.buckets[kind].remaining()
+
+    def sheet_lock(self, sheet_name):
+        # 같은 스레드가 잠근 채로 save_data를 다시 부를 수 있으므로 RLock
+        with self.lock:
+            return self.sheet_locks.setdefault(sheet_name, threading.RLock())
+
+    def remember(self, sheet_name, df, age=0, stale=False):
+        # stale=True: 한도 초과 때 대신 보여주는 예전 데이터 (이걸 바탕으로 시트 전체를 다시 쓰면 그사이 기록이 지워짐)
+        # 내용 버전은 프레임 옆에 보관 (df.attrs는 부분/사본에도 그대로 복사되어 다른 데이터와 버전이 섞임)
+        self.stale[sheet_name] = (time.monotonic() - age, df, stale, content_version(df))
+
+    def version_of(self, df):
+        """보관 중인 바로 그 프레임이면 버전, 아니면(부분/사본 포함) None"""
+        for _, frame, _, version in list(self.stale.values()):
+            if frame is df: return version
         return None
 
-def get_worksheet(worksheet_name):
+    def is_stale(self, sheet_name):
+        entry = self.stale.get(sheet_name)
+        return entry is not None and entry[2]
+
+    def recall(self, sheet_name, max_age=None):
+        # 복사하지 않고 공유 객체를 그대로 돌려줌 (읽기 전용으로 사용, 고칠 때는 editable())
+        entry = self.stale.get(sheet_name)
+        if entry is None: return None
+        fetched_at, df, _, _ = entry
+        if max_age is not None and time.monotonic() - fetched_at > max_age: return None
+        return df
+
+# --- 1-2. 교회별 상태 보관 (개수 제한 + 미사용 시 정리) ---
+class TenantState:
+    """교회 하나의 서버 쪽 상태: API 예산/보관 데이터/워크시트, 검색 색인"""
+    def __init__(self, budget):
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.text_indexes = {}
+        self.caches = {}   # 함수 이름 -> {인자: 결과} (최근 사용순, tenant_cache)
+        self.last_used = time.monotonic()
+
+class TenantPool:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients = collections.OrderedDict()   # 인증 키 -> 구글 클라이언트 (최근 사용순)
+        self.quotas = {}                           # 인증 키 -> 토큰 버킷 (같은 계정을 쓰는 교회끼리 한도 공유)
+        self.sheet_locks = {}                      # 교회코드 -> {탭: 잠금} (교회 상태가 정리돼도 저장 중인 잠금은 유지)
+        self.tenants = collections.OrderedDict()   # 교회코드 -> TenantState (최근 사용순)
+
+    def client(self, credentials_key):
+        with self.lock:
+            if credentials_key in self.clients:
+                self.clients.move_to_end(credentials_key)
+                return self.clients[credentials_key]
+        client = authorize_client(credentials_key)
+        with self.lock:
+            self.clients[credentials_key] = client
+            while len(self.clients) > CLIENT_POOL_SIZE: self.clients.popitem(last=False)
+        return client
+
+    def state(self, tenant_id):
+        now = time.monotonic()
+        with self.lock:
+            for tid in [t for t, s in self.tenants.items() if t != tenant_id and now - s.last_used > TENANT_IDLE_SECONDS]:
+                del self.tenants[tid]
+            if tenant_id not in self.tenants:
+                credentials_key = get_tenant_registry()[tenant_id]["credentials"]
+                buckets = self.quotas.setdefault(credentials_key, new_quota_buckets())
+                self.tenants[tenant_id] = TenantState(RequestBudget(buckets, self.sheet_locks.setdefault(tenant_id, {})))
+            state = self.tenants[tenant_id]
+            state.last_used = now
+            self.tenants.move_to_end(tenant_id)
+            while len(self.tenants) > MAX_ACTIVE_TENANTS: self.tenants.popitem(last=False)
+            return state
+
+@st.cache_resource
+def get_tenant_pool():
+    return TenantPool()
+
+def get_request_budget():
+    return get_tenant_pool().state(current_tenant_id()).budget
+
+def tenant_cache(max_entries):
+    """교회별 결과 캐시. st.cache_*처럼 '_'로 시작하는 인자는 키에서 빼며, 교회 상태가 정리될 때 함께 사라짐
+    (st.cache_data는 모든 교회가 한 캐시를 나눠 써서 교회가 많으면 서로의 결과를 밀어냄)"""
+    def decorator(func):
+        arg_names = func.__code__.co_varnames[:func.__code__.co_argcount]
+        def wrapper(*args):
+            key = tuple(a for name, a in zip(arg_names, args) if not name.startswith("_"))
+            state = get_tenant_pool().state(current_tenant_id())
+            with state.lock:
+                cache = state.caches.setdefault(func.__name__, collections.OrderedDict())
+                if key in cache:
+                    cache.move_to_end(key)
+                    return cache[key]
+            value = func(*args)
+            with state.lock:
+                cache[key] = value
+                while len(cache) > max_entries: cache.popitem(last=False)
+            return value
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
+
+def serve_stale(sheet_name):
+    """한도 초과/일시 오류 시 마지막으로 받아온 데이터로 대신 표시"""
+    budget = get_request_budget()
+    df = budget.recall(sheet_name)
+    if df is None: df = read_sheet_snapshot(sheet_name)
+    if df is None: return None
+    budget.remember(sheet_name, df, age=DATA_TTL - STALE_RETRY_SECONDS, stale=True)
+    budget.stats["stale_served"] += 1
+    st.toast("⏳ 접속량이 많아 잠시 전 데이터를 보여드리고 있습니다.")
+    return df
+
+def get_worksheet(worksheet_name, writing=False, create=True):
+    """writing=True(저장용)이면 보관 데이터가 있어도 오류를 항상 보여줌 (읽기만 예전 데이터로 대신할 수 있음)
+    create=False(점검용)이면 없는 탭을 만들지 않고 오류로 처리"""
     client = get_google_sheet_client()
     if not client: return None
+    budget = get_request_budget()
+    # 한 번 연 워크시트는 재사용하여 open/worksheet 읽기 호출을 아낌
+    if worksheet_name in budget.worksheets:
+        return budget.worksheets[worksheet_name]
+    if not budget.acquire("read", 2):
+        sheet_error("⚠️ 접속량이 많아 일시적으로 지연됩니다. 잠시 후 다시 시도해주세요.", show=writing or budget.recall(worksheet_name) is None)
+        return None
     try:
-        sheet = client.open(SHEET_NAME)
+        sheet_name = get_tenant_config()["sheet_name"]
+        sheet = client.open(sheet_name)
         try:
-            return sheet.worksheet(worksheet_name)
-        except:
-            return sheet.add_worksheet(title=worksheet_name, rows=100, cols=20)
+            ws = sheet.worksheet(worksheet_name)
+        except gspread.exceptions.WorksheetNotFound:
+            if not create:
+                sheet_error(f"'{worksheet_name}' 탭이 없습니다."); return None
+            budget.acquire("write", max_wait=QUOTA_MAX_WAIT_WRITE)
+            ws = sheet.add_worksheet(title=worksheet_name, rows=100, cols=20)
+        budget.worksheets[worksheet_name] = ws
+        return ws
     except gspread.exceptions.SpreadsheetNotFound:
-        st.error(f"오류: 구글 시트 '{SHEET_NAME}'을 찾을 수 없습니다.")
+        sheet_error(f"오류: 구글 시트 '{sheet_name}'을 찾을 수 없습니다.")
         return None
-    except gspread.exceptions.APIError:
-        st.error("⚠️ 접속량이 많아 일시적으로 지연됩니다. 잠시 후 다시 시도해주세요.")
+    except gspread.exceptions.APIError as e:
+        budget.penalize("read")
+        sheet_error(f"⚠️ 접속량이 많아 일시적으로 지연됩니다. 잠시 후 다시 시도해주세요. ({e})", show=writing or budget.recall(worksheet_name) is None)
         return None
 
 # --- 2. 데이터 관리 ---
-@st.cache_data(ttl=60)
 def load_data(sheet_name):
+    """교회/탭별 공유 데이터. 모든 세션이 같은 읽기 전용 DataFrame을 받음 (세션마다 복사/역직렬화 없음)"""
+    budget = get_request_budget()
+    fresh = budget.recall(sheet_name, max_age=DATA_TTL)
+    if fresh is not None: return fresh
+    # 같은 탭을 여러 세션이 동시에 요청하면 한 번만 받아오고 나머지는 그 결과를 재사용
+    with budget.sheet_lock(sheet_name):
+        fresh = budget.recall(sheet_name, max_age=DATA_TTL)
+        if fresh is not None: return fresh
+        df = fetch_sheet(sheet_name)
+        if df is None:
+            stale = serve_stale(sheet_name)
+            return stale if stale is not None else pd.DataFrame(columns=EXPECTED_COLS.get(sheet_name, []))
+        budget.remember(sheet_name, df)
+        return df
+
+def invalidate_data(sheet_name):
+    """저장 후 호출: 다음 load_data 때 새 버전을 받아옴"""
+    get_request_budget().stale.pop(sheet_name, None)
+
+def freeze_frame(df):
+    """공유용 변환: 문자열 열은 변경 불가능한 Arrow 배열로 (copy-on-write는 configure_pandas에서 켬)"""
+    try: df = df.astype("string[pyarrow]")
+    except ImportError: pass
+    return df
+
+def editable(df):
+    """공유 데이터를 직접 고쳐야 할 때 쓰는 사본 (copy-on-write라 실제로 바뀐 열만 복사됨)"""
+    try: cow = int(pd.__version__.split(".")[0]) >= 3 or pd.get_option("mode.copy_on_write") is True  # pandas 3부터는 항상 copy-on-write
+    except Exception: cow = False  # 확인할 수 없으면 공유 데이터를 건드리지 않도록 깊은 복사
+    return df.copy(deep=not cow)
+
+def fetch_sheet(sheet_name):
+    """구글 시트에서 직접 읽어옴. 한도 초과/API 오류 시 None"""
+    budget = get_request_budget()
     ws = get_worksheet(sheet_name)
-    if not ws: return pd.DataFrame()
+    if not ws: return None
+    if not budget.acquire("read"):
+        sheet_error("구글 API 읽기 한도 초과", show=False); return None
     
     # [v3.3 수정] GSpreadException 방어막 추가 (첫 행 제목 오류 감지)
     try:
         data = ws.get_all_records()
+    except gspread.exceptions.APIError as e:
+        budget.penalize("read")
+        budget.worksheets.pop(sheet_name, None)
+        sheet_error(f"구글 API 오류 ({e})", show=False)
+        return None
     except gspread.exceptions.GSpreadException as e:
+        # 명령줄에서는 st.stop()이 멈추지 않으므로, 빈 표를 돌려주지 않고 원인과 함께 예외로 올림
+        sheet_error(f"'{sheet_name}' 탭 1행(제목 행) 오류: 빈 제목 열 또는 중복 제목이 있습니다. ({e})", show=False)
         st.error(f"🚨 **구글 시트 데이터 오류!**\n\n**'{sheet_name}'** 탭의 **첫 번째 줄(제목 행)**에 문제가 있습니다.\n\n✔️ 제목 칸이 비어있는 열(빈칸)이 있거나\n✔️ 똑같은 이름의 제목이 두 개 이상 존재합니다.\n👉 **구글 시트를 열어 1행의 제목을 정리해 주시면 정상 작동합니다.**")
         st.stop()
         return pd.DataFrame()
     
-    expected_cols = {
-        "members": ["이름", "성별", "생일", "음력", "전화번호", "주소", "가족ID", "소그룹", "비고"],
-        "attendance_log": ["날짜", "모임명", "이름", "소그룹", "출석여부"],
-        "users": ["아이디", "비밀번호", "이름", "역할", "담당소그룹"],
-        "prayer_log": ["날짜", "이름", "소그룹", "내용", "작성자"],
-        "notices": ["날짜", "내용", "작성자"],
-        "reports": ["날짜", "작성자", "내용", "답변"]
-    }
-    
     if not data:
-        cols = expected_cols.get(sheet_name, [])
+        cols = EXPECTED_COLS.get(sheet_name, [])
         return pd.DataFrame(columns=cols)
     
     df = pd.DataFrame(data).astype(str)
     
-    if sheet_name in expected_cols:
-        for col in expected_cols[sheet_name]:
+    if sheet_name in EXPECTED_COLS:
+        for col in EXPECTED_COLS[sheet_name]:
             if col not in df.columns:
                 df[col] = "" 
                 
-    return df
+    return freeze_frame(df)
 
 def save_data(sheet_name, df):
-    ws = get_worksheet(sheet_name)
-    if ws:
-        ws.clear()
-        ws.append_row(df.columns.tolist())
-        ws.update(range_name='A2', values=df.values.tolist())
-        load_data.clear()
+    """저장에 성공하면 True. 실패하면 오류를 보여주고 False (호출하는 쪽은 성공 메시지를 띄우지 않음)"""
+    budget = get_request_budget()
+    ws = get_worksheet(sheet_name, writing=True)
+    if not ws: return False
+    if budget.is_stale(sheet_name):
+        st.error("⚠️ 접속량이 많아 예전 데이터를 보여드리는 중이라 저장하지 않았습니다. 잠시 후 새로고침한 뒤 다시 저장해주세요.")
+        return False
+    # 시트 전체를 다시 쓰는 동안 같은 탭의 다른 저장(간편 출석의 행 삭제 등)이 끼어들지 않도록 잠금
+    with budget.sheet_lock(sheet_name):
+        # clear + append_row + update = 쓰기 3회
+        if not budget.acquire("write", 3, max_wait=QUOTA_MAX_WAIT_WRITE):
+            st.error("⚠️ 저장 요청이 몰려 있습니다. 잠시 후 다시 저장해주세요.")
+            return False
+        try:
+            ws.clear()
+            ws.append_row(df.columns.tolist())
+            # Arrow 문자열 열의 빈 칸(<NA>)은 JSON으로 보낼 수 없으므로 빈 문자열로
+            ws.update(range_name='A2', values=df.astype(object).where(df.notna(), "").values.tolist())
+        except gspread.exceptions.APIError:
+            budget.penalize("write")
+            budget.worksheets.pop(sheet_name, None)
+            st.error("⚠️ 접속량이 많아 저장하지 못했습니다. 잠시 후 다시 저장해주세요.")
+            return False
+        invalidate_data(sheet_name)
+    return True
+
+# --- 2-1. 미리 계산한 결과 (명령줄 작업이 만들고, 화면에서는 읽기만 함) ---
+SNAPSHOT_DIR = os.environ.get("CHURCH_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "precomputed"))
+
+def snapshot_path(name, tenant_id=None):
+    return os.path.join(SNAPSHOT_DIR, tenant_id or current_tenant_id(), name)
+
+def read_manifest():
+    try:
+        with open(snapshot_path("manifest.json"), encoding="utf-8") as f: return json.load(f)
+    except (OSError, ValueError): return {}
+
+def write_snapshot(name, writer, manifest_updates=None):
+    """임시 파일에 쓴 뒤 바꿔치기하여, 읽는 쪽이 반쯤 쓰인 파일을 보지 않게 함"""
+    path = snapshot_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    writer(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    if manifest_updates:
+        manifest = read_manifest()
+        manifest.update(manifest_updates)
+        manifest["updated_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+        with open(snapshot_path("manifest.json.tmp"), "w", encoding="utf-8") as f: json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(snapshot_path("manifest.json.tmp"), snapshot_path("manifest.json"))
+
+def read_sheet_snapshot(sheet_name):
+    """warm 작업이 저장해 둔 시트 사본 (없으면 None)"""
+    try: df = pd.read_parquet(snapshot_path(f"sheet_{sheet_name}.parquet"))
+    except Exception: return None
+    return freeze_frame(df)
+
+def read_precomputed(name, sheet_name, version):
+    """원본 시트 버전이 지금과 같을 때만 미리 계산한 결과를 읽음"""
+    if read_manifest().get(f"{name}:{sheet_name}") != version: return None
+    path = snapshot_path(name)
+    try:
+        if path.endswith(".parquet"): return pd.read_parquet(path)
+        with open(path, "rb") as f: return pickle.load(f)
+    except Exception: return None
 
 # --- 3. 헬퍼 함수 ---
 def get_week_range(date_obj):
@@ -183,14 +628,15 @@ def get_day_name(date_obj):
     return days[date_obj.weekday()]
 
 def get_target_columns(weekday_idx, group_name):
+    meetings = get_meeting_config()
     if weekday_idx != 6:
-        return MEETING_CONFIG.get(weekday_idx, [])
-    if group_name == "전체 보기": return SUNDAY_ALL
+        return meetings["weekday"].get(weekday_idx, [])
+    if group_name == "전체 보기": return meetings["sunday_all"]
     g_name = str(group_name)
-    if "중고등" in g_name: return COLS_YOUTH
-    elif "청년" in g_name: return COLS_YOUNG
-    elif "주일학교" in g_name or "유초등" in g_name or "유치부" in g_name: return COLS_KIDS
-    else: return COLS_ADULT
+    if "중고등" in g_name: return meetings["youth"]
+    elif "청년" in g_name: return meetings["young"]
+    elif "주일학교" in g_name or "유초등" in g_name or "유치부" in g_name: return meetings["kids"]
+    else: return meetings["adult"]
 
 def extract_date_numbers(date_str):
     nums = []
@@ -206,6 +652,15 @@ def extract_date_numbers(date_str):
         nums.append(int(current_num))
     return nums
 
+def shift_calendar_month(step):
+    month = st.session_state["cal_month"] + step
+    year = st.session_state["cal_year"]
+    if month == 0: month, year = 12, year - 1
+    elif month == 13: month, year = 1, year + 1
+    st.session_state["cal_month"], st.session_state["cal_year"] = month, year
+
+# ◀/▶ 클릭은 달력 조각만 다시 실행 (로그인/데이터 로딩/메뉴는 다시 돌지 않음)
+@st.fragment
 def draw_birthday_calendar(df_members):
     real_today = datetime.date.today()
     if "cal_year" not in st.session_state:
@@ -214,25 +669,18 @@ def draw_birthday_calendar(df_members):
         st.session_state["cal_month"] = real_today.month
 
     c_prev, c_title, c_next = st.columns([1, 4, 1])
-    with c_prev:
-        if st.button("◀ 이전"):
-            st.session_state["cal_month"] -= 1
-            if st.session_state["cal_month"] == 0:
-                st.session_state["cal_month"] = 12
-                st.session_state["cal_year"] -= 1
-            st.rerun()
+    c_prev.button("◀ 이전", on_click=shift_calendar_month, args=(-1,))
     with c_title:
         st.markdown(f"<h3 style='text-align: center; margin: 0;'>{st.session_state['cal_year']}년 {st.session_state['cal_month']}월</h3>", unsafe_allow_html=True)
-    with c_next:
-        if st.button("다음 ▶"):
-            st.session_state["cal_month"] += 1
-            if st.session_state["cal_month"] == 13:
-                st.session_state["cal_month"] = 1
-                st.session_state["cal_year"] += 1
-            st.rerun()
+    c_next.button("다음 ▶", on_click=shift_calendar_month, args=(1,))
 
-    year = st.session_state["cal_year"]
-    month = st.session_state["cal_month"]
+    html_code = render_calendar_html(data_version(df_members), st.session_state["cal_year"], st.session_state["cal_month"], real_today, df_members)
+    st.markdown(html_code, unsafe_allow_html=True)
+
+@tenant_cache(max_entries=24)
+def render_calendar_html(version, year, month, real_today, _df_members):
+    """명단 버전/연월/오늘 날짜가 같으면 음력 변환과 HTML 생성을 다시 하지 않음"""
+    df_members = _df_members
     birthdays = {}
     calendar_converter = KoreanLunarCalendar()
 
@@ -297,12 +745,10 @@ def draw_birthday_calendar(df_members):
                         html_code += f'<span class="{person["style"]}">🎂{person["name"]}</span>'
                 html_code += '</div>'
     html_code += '</div>'
-    st.markdown(html_code, unsafe_allow_html=True)
-
-def draw_changelog():
-    st.subheader("🛠️ 개발 및 업데이트 로그")
-    st.info("이 시스템이 발전해 온 기록입니다.")
+    return html_code
 
+@st.cache_resource
+def get_changelog_html():
     logs = [
         ("v3.3", "2026-02-18", "시트 제목행 오류 방어막 추가", 
          "- **오류 방어:** 구글 시트에서 열을 삭제/이동하다가 빈 열이나 중복 열이 생겨 앱이 다운되는 현상(GSpreadException)을 방지하도록 예외 처리 추가\n- **친절한 에러 안내:** 빨간 에러 메시지 대신 어떤 탭의 제목 줄을 고쳐야 하는지 정확히 짚어주도록 개선"),
@@ -337,20 +783,25 @@ def draw_changelog():
         ("v2.0", "2026-01-24", "음력 생일 완벽 지원", 
          "- 한국형 음력 캘린더 라이브러리 탑재\n- 'O' 표시만으로 매년 달라지는 음력 생일을 자동 계산하여 양력 달력에 표시"),
     ]
+    # 한 번만 HTML로 만들어 두고 한 번의 st.markdown으로 전송
+    return "\n".join(
+        f'<div class="log-entry">'
+        f'<span class="log-ver">{ver}</span> <span class="log-date">{date}</span>'
+        f'<div style="font-weight: bold; margin-top: 5px;">{title}</div>'
+        f'<div style="white-space: pre-wrap; font-size: 0.95em; color: #555; margin-top: 5px;">{desc}</div>'
+        f'</div>'
+        for ver, date, title, desc in logs
+    )
 
-    for ver, date, title, desc in logs:
-        st.markdown(f"""
-        <div class="log-entry">
-            <span class="log-ver">{ver}</span> <span class="log-date">{date}</span>
-            <div style="font-weight: bold; margin-top: 5px;">{title}</div>
-            <div style="white-space: pre-wrap; font-size: 0.95em; color: #555; margin-top: 5px;">{desc}</div>
-        </div>
-        """, unsafe_allow_html=True)
+def draw_changelog():
+    st.subheader("🛠️ 개발 및 업데이트 로그")
+    st.info("이 시스템이 발전해 온 기록입니다.")
+    st.markdown(get_changelog_html(), unsafe_allow_html=True)
 
 def draw_manual_tab():
-    st.markdown("## 📘 회정교회 출석체크 시스템 사용법 (v3.3)")
+    st.markdown(f"## 📘 {get_tenant_config()['name']} 출석체크 시스템 사용법 (v3.3)")
     with st.expander("✅ 1. 출석체크 하는 법"):
-        st.markdown("1. **[📋 출석체크]** 메뉴 선택.\n2. 상단 정렬 옵션에서 **'🌱 출석유무순'**을 쓰면 활동 성도가 위로 올라와 편합니다.\n3. 체크 후 **[✅ 출석 저장하기]** 필수.")
+        st.markdown("1. **[📋 출석체크]** 메뉴 선택.\n2. 상단 정렬 옵션에서 **'🌱 출석유무순'**을 쓰면 활동 성도가 위로 올라와 편합니다.\n3. 체크 후 **[✅ 출석 저장하기]** 필수.\n4. 휴대폰에서는 **'📱 간편 모드'**를 켜면 가볍게 체크하고 바뀐 출석만 저장됩니다.")
     with st.expander("📊 2. 통계 및 보고서"):
         st.markdown("1. **[📊 통계]**에서 기간별 출석 현황 확인.\n2. **[📨 사역 보고]**에서 보고서 작성 (본인 작성 내용만 보임).")
     with st.expander("🙏 3. 기도제목 관리"):
@@ -370,8 +821,746 @@ def draw_notice_section(is_admin, current_user_name):
                 n_content = st.text_area("내용", height=100)
                 if st.form_submit_button("등록"):
                     new_n = pd.DataFrame([{"날짜": str(n_date), "내용": n_content, "작성자": current_user_name}])
-                    save_data("notices", pd.concat([df_notices, new_n], ignore_index=True))
-                    st.success("등록됨"); st.rerun()
+                    if save_data("notices", pd.concat([df_notices, new_n], ignore_index=True)):
+                        st.success("등록됨"); st.rerun()
+
+# --- 3-0. 화면 조각 (st.fragment: 클릭하면 해당 조각만 다시 실행) ---
+@st.fragment
+def draw_attendance_grid(df_grid, col_conf, chk_date, day_str, grp, target_meetings):
+    # 체크박스를 누를 때마다 이 표만 다시 실행됨. 저장할 때만 전체 화면을 새로 고침
+    edited_df = st.data_editor(df_grid, column_config=col_conf, hide_index=True, use_container_width=True)
+
+    if st.button("✅ 출석 저장하기", use_container_width=True):
+        df_att = load_data("attendance_log")
+        mask_date = df_att["날짜"] == str(chk_date)
+        mask_grp = df_att["소그룹"] == grp if grp != "전체 보기" else True
+        mask_meeting = df_att["모임명"].isin(target_meetings)
+        df_clean = df_att[~(mask_date & mask_grp & mask_meeting)]
+        new_records = []
+        for _, row in edited_df.iterrows():
+            name = row["이름"]
+            u_grp = row["소그룹"]
+            for col in target_meetings:
+                if row[col]:
+                    new_records.append({
+                        "날짜": str(chk_date), "모임명": col, "이름": name, "소그룹": u_grp, "출석여부": "출석"
+                    })
+        final_df = pd.concat([df_clean, pd.DataFrame(new_records)], ignore_index=True)
+        if save_data("attendance_log", final_df):
+            st.success(f"✅ {chk_date} ({day_str}) 출석 저장 완료!"); st.rerun()
+
+def report_card_html(date_text, content, answer):
+    html_content = f"""<div class="report-card"><div class="report-header">🗓️ {date_text}</div><div class="report-content">{content}</div>"""
+    if answer and str(answer).strip() != "":
+        html_content += f"""<div class="reply-box"><div class="reply-title">💌 목회자 피드백</div><div>{answer}</div></div>"""
+    return html_content + "</div>"
+
+@st.fragment
+def draw_prayer_card(i, r):
+    if st.session_state.get(f"pray_edit_{i}", False):
+        with st.form(f"pray_form_{i}"):
+            st.caption(f"📝 기도제목 수정 (No.{i})")
+            edit_p_date = st.date_input("날짜", pd.to_datetime(r['날짜']))
+            edit_p_content = st.text_area("내용", r['내용'])
+            c_save, c_cancel = st.columns(2)
+            if c_save.form_submit_button("💾 수정 저장"):
+                df_prayer = editable(load_data("prayer_log"))
+                df_prayer.at[i, '날짜'] = str(edit_p_date)
+                df_prayer.at[i, '내용'] = edit_p_content
+                if save_data("prayer_log", df_prayer):
+                    st.session_state[f"pray_edit_{i}"] = False
+                    st.success("수정되었습니다."); time.sleep(0.5); st.rerun()
+            if c_cancel.form_submit_button("취소"):
+                st.session_state[f"pray_edit_{i}"] = False
+                st.rerun(scope="fragment")
+    else:
+        col_content, col_btns = st.columns([8, 3]) 
+        with col_content:
+            st.info(f"**{r['날짜']}**: {r['내용']}")
+        with col_btns:
+            b1, b2 = st.columns(2)
+            with b1:
+                if st.button("✏️ 수정", key=f"p_edit_{i}"):
+                    st.session_state[f"pray_edit_{i}"] = True
+                    st.rerun(scope="fragment")
+            with b2:
+                if st.button("🗑️ 삭제", key=f"p_del_{i}"):
+                    if save_data("prayer_log", load_data("prayer_log").drop(i)):
+                        st.success("삭제됨"); time.sleep(0.5); st.rerun()
+
+@st.fragment
+def draw_admin_report_card(i, row):
+    with st.container():
+        st.markdown(report_card_html(f"{row['날짜']} | 👤 {row['작성자']}", row['내용'], ""), unsafe_allow_html=True)
+        new_ans = st.text_area(f"💬 {row['작성자']}님 보고에 대한 피드백 작성", value=row['답변'], key=f"ans_{i}", height=70)
+        
+        c_save, c_del = st.columns([1, 1])
+        with c_save:
+            if st.button("답변 저장", key=f"btn_{i}"):
+                df_reports = editable(load_data("reports"))
+                df_reports.at[i, "답변"] = new_ans
+                if save_data("reports", df_reports):
+                    st.success(f"✅ {row['작성자']}님에게 답변을 저장했습니다!"); time.sleep(1); st.rerun()
+        with c_del:
+            if st.button("🗑️ 보고서 삭제", key=f"adm_del_{i}"):
+                if save_data("reports", load_data("reports").drop(i)):
+                    st.success("삭제되었습니다."); time.sleep(0.5); st.rerun()
+        st.divider()
+
+@st.fragment
+def draw_report_card(i, row):
+    if st.session_state.get(f"edit_mode_{i}", False):
+        with st.form(f"edit_form_{i}"):
+            st.caption(f"📝 보고서 수정 (No.{i})")
+            edit_date = st.date_input("날짜", pd.to_datetime(row['날짜']))
+            edit_content = st.text_area("내용", row['내용'], height=150)
+            c_save, c_cancel = st.columns(2)
+            if c_save.form_submit_button("💾 수정 완료"):
+                df_reports = editable(load_data("reports"))
+                df_reports.at[i, '날짜'] = str(edit_date)
+                df_reports.at[i, '내용'] = edit_content
+                if save_data("reports", df_reports):
+                    st.session_state[f"edit_mode_{i}"] = False
+                    st.success("수정되었습니다!"); time.sleep(0.5); st.rerun()
+            if c_cancel.form_submit_button("취소"):
+                st.session_state[f"edit_mode_{i}"] = False
+                st.rerun(scope="fragment")
+    else:
+        st.markdown(report_card_html(f"{row['날짜']} 제출", row['내용'], row['답변']), unsafe_allow_html=True)
+        
+        c_edit, c_del = st.columns([1, 4]) 
+        with c_edit:
+            if st.button("✏️ 수정", key=f"btn_edit_{i}"):
+                st.session_state[f"edit_mode_{i}"] = True
+                st.rerun(scope="fragment")
+        with c_del:
+            if st.button("🗑️ 삭제", key=f"btn_del_{i}"):
+                if save_data("reports", load_data("reports").drop(i)):
+                    st.success("삭제되었습니다."); time.sleep(0.5); st.rerun()
+
+# --- 3-1. 자료 내보내기 (청크 단위 스트리밍) ---
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_KINDS = ["출석 기록", "개인별 출석표", "주간 출석 인원", "기도제목", "사역 보고"]
+PRIVATE_EXPORT_KINDS = ["기도제목", "사역 보고"]
+# 형식: (확장자, MIME, 작성 함수 이름, 필요한 모듈)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv", "write_export_csv", None),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "write_export_xlsx", "openpyxl"),
+    "Parquet": ("parquet", "application/octet-stream", "write_export_parquet", "pyarrow"),
+}
+
+def available_export_formats():
+    return [f for f, (_, _, _, mod) in EXPORT_FORMATS.items() if mod is None or importlib.util.find_spec(mod)]
+
+def iter_sorted_chunks(df, dates, size=EXPORT_CHUNK_ROWS):
+    """날짜순 청크를 하나씩 만들어 내보냄 (전체 정렬본을 따로 만들지 않음)"""
+    order = dates.sort_values(kind="stable").index
+    if len(order) == 0:
+        yield df.iloc[0:0]
+        return
+    for pos in range(0, len(order), size):
+        yield df.loc[order[pos:pos + size]]
+
+def iter_export_rows(kind, start_d, end_d, current_user, groups=None):
+    """권한과 기간에 맞는 자료를 DataFrame 청크로 내보냄 (groups=None 이면 전체 소그룹)"""
+    user_role = str(current_user.get("역할", "")).lower().strip()
+
+    if kind in PRIVATE_EXPORT_KINDS:
+        # [v3.0] 기도제목/보고서 권한: 관리자는 전체, 뷰어는 없음, 리더는 본인 작성분만
+        if user_role == "viewer": return
+        df = load_data("prayer_log" if kind == "기도제목" else "reports")
+        if user_role != "admin": df = df[df["작성자"] == current_user["이름"]]
+        dates = pd.to_datetime(df["날짜"], errors='coerce')
+        mask = (dates >= pd.Timestamp(start_d)) & (dates <= pd.Timestamp(end_d))
+        yield from iter_sorted_chunks(df, dates[mask])
+        return
+
+    df = load_data("attendance_log")
+    if groups is not None: df = df[df["소그룹"].isin(groups)]
+    dates = pd.to_datetime(df["날짜"], errors='coerce')
+    mask = (dates >= pd.Timestamp(start_d)) & (dates <= pd.Timestamp(end_d))
+
+    if kind == "출석 기록":
+        yield from iter_sorted_chunks(df, dates[mask])
+        return
+
+    att = df[mask]
+    order = get_meeting_config()["ordered"]
+    meetings = order + sorted(set(att["모임명"]) - set(order))
+    key_cols = ["소그룹", "이름"] if kind == "개인별 출석표" else ["주 시작일(일)"]
+    if att.empty:
+        yield pd.DataFrame(columns=key_cols + meetings)
+        return
+    if kind == "개인별 출석표":
+        table = pd.crosstab([att["소그룹"], att["이름"]], att["모임명"])
+    else:
+        weeks = dates[mask].dt.to_period("W-SAT").dt.start_time.dt.strftime('%Y-%m-%d').rename("주 시작일(일)")
+        table = att.groupby([weeks, att["모임명"]]).size().unstack(fill_value=0)
+    table = table.reindex(columns=meetings, fill_value=0)
+    # 집계표는 (인원 x 모임) 또는 (주 x 모임) 크기라 작음
+    table = table.reset_index()
+    for pos in range(0, max(len(table), 1), EXPORT_CHUNK_ROWS):
+        yield table.iloc[pos:pos + EXPORT_CHUNK_ROWS]
+
+def write_export_csv(chunks, fh):
+    text = io.TextIOWrapper(fh, encoding="utf-8-sig", newline="")
+    for n, chunk in enumerate(chunks):
+        chunk.to_csv(text, header=(n == 0), index=False)
+    text.flush()
+    text.detach()
+
+def write_export_xlsx(chunks, fh):
+    openpyxl = importlib.import_module("openpyxl")
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("data")
+    for n, chunk in enumerate(chunks):
+        if n == 0: ws.append([str(c) for c in chunk.columns])
+        for row in chunk.itertuples(index=False):
+            ws.append(list(row))
+    wb.save(fh)
+
+def write_export_parquet(chunks, fh):
+    pa = importlib.import_module("pyarrow")
+    pq = importlib.import_module("pyarrow.parquet")
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None: writer = pq.ParquetWriter(fh, table.schema)
+        writer.write_table(table.cast(writer.schema))
+    if writer: writer.close()
+
+def build_export_file(chunks, fmt):
+    """청크를 임시 파일에 바로 써 내려가고, 다 쓰면 읽기용 파일 핸들을 돌려줌"""
+    writer = globals()[EXPORT_FORMATS[fmt][2]]
+    tmp = tempfile.NamedTemporaryFile(suffix="." + EXPORT_FORMATS[fmt][0], delete=False)
+    try:
+        with tmp: writer(chunks, tmp.file)
+        return open(tmp.name, "rb")
+    finally:
+        os.unlink(tmp.name)
+
+def draw_export_tab(current_user, is_admin, is_viewer):
+    st.subheader("📦 자료 내보내기")
+    st.markdown('<div class="info-tip">💡 <b>Tip:</b> 연말 보고서나 교단 통계용 자료를 파일로 받아보세요. 기간이 길어도 나눠서 만들기 때문에 안전합니다.</div>', unsafe_allow_html=True)
+
+    kinds = [k for k in EXPORT_KINDS if not (is_viewer and k in PRIVATE_EXPORT_KINDS)]
+    c1, c2, c3 = st.columns([1, 1, 2])
+    kind = c1.selectbox("자료 종류", kinds)
+    fmt = c2.selectbox("파일 형식", available_export_formats())
+    today = datetime.date.today()
+    date_range = c3.date_input("📅 기간", (datetime.date(today.year, 1, 1), today), format="YYYY/MM/DD", key="export_range")
+
+    if is_admin or is_viewer: groups = None
+    else:
+        groups = [g.strip() for g in str(current_user["담당소그룹"]).split(",") if g.strip()]
+        if kind not in PRIVATE_EXPORT_KINDS: st.info(f"담당: {', '.join(groups)}")
+    if kind in PRIVATE_EXPORT_KINDS and not is_admin:
+        st.caption("🔒 본인이 작성한 내용만 내보냅니다.")
+
+    if len(date_range) == 2 and st.button("📦 파일 만들기", use_container_width=True):
+        start_d, end_d = date_range
+        with st.spinner("파일을 만드는 중입니다..."):
+            fh = build_export_file(iter_export_rows(kind, start_d, end_d, current_user, groups), fmt)
+        ext, mime = EXPORT_FORMATS[fmt][0], EXPORT_FORMATS[fmt][1]
+        with fh:
+            st.download_button("⬇️ 다운로드", data=fh, file_name=f"{kind}_{start_d}_{end_d}.{ext}", mime=mime, use_container_width=True)
+
+# --- 3-2. 출석 추세 (데이터 버전별 캐시) ---
+def data_version(df):
+    """내용 기반 버전 값 (내용이 같으면 세션/프로세스가 달라도 같은 값)
+    load_data가 돌려준 프레임이면 보관할 때 계산해 둔 값을 쓰고, 부분/사본은 그 내용으로 다시 계산"""
+    known = get_request_budget().version_of(df)
+    return known if known is not None else content_version(df)
+
+def content_version(df):
+    if df.empty: return "empty"
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()[:16]
+
+@tenant_cache(max_entries=2)
+def get_attendance_cube(version, _df_att):
+    # aggregates 작업이 같은 버전으로 미리 만들어 두었으면 그대로 사용
+    cube = read_precomputed("attendance_cube.parquet", "attendance_log", version)
+    return cube if cube is not None else build_attendance_cube(_df_att)
+
+def build_attendance_cube(df_att):
+    """(날짜, 소그룹, 모임명)별 출석 인원 - 모든 추세표의 바탕이 되는 한 번의 집계"""
+    dates = pd.to_datetime(df_att["날짜"], errors='coerce')
+    base = pd.DataFrame({"날짜": dates, "소그룹": df_att["소그룹"], "모임명": df_att["모임명"]}).dropna(subset=["날짜"])
+    return base.groupby(["날짜", "소그룹", "모임명"]).size().rename("인원").reset_index()
+
+@tenant_cache(max_entries=32)
+def get_trend_table(version, _df_att, freq, by, groups, order):
+    """주간/월간 x 소그룹/모임별 인원표 (빈 기간은 0으로 채움)"""
+    cube = get_attendance_cube(version, _df_att)
+    if groups is not None: cube = cube[cube["소그룹"].isin(groups)]
+    if cube.empty: return pd.DataFrame()
+    period = cube["날짜"].dt.to_period("W-SAT" if freq == "주간" else "M").dt.start_time
+    table = cube.groupby([period, cube[by]])["인원"].sum().unstack(fill_value=0)
+    full_range = pd.date_range(table.index.min(), table.index.max(), freq="W-SUN" if freq == "주간" else "MS")
+    table = table.reindex(full_range, fill_value=0)
+    if by == "모임명":
+        table = table[[c for c in order if c in table.columns] + [c for c in table.columns if c not in order]]
+    return table
+
+@tenant_cache(max_entries=16)
+def get_yoy_table(version, _df_att, groups):
+    """월(행) x 연도(열) 출석 인원표"""
+    cube = get_attendance_cube(version, _df_att)
+    if groups is not None: cube = cube[cube["소그룹"].isin(groups)]
+    if cube.empty: return pd.DataFrame()
+    table = cube.groupby([cube["날짜"].dt.month, cube["날짜"].dt.year])["인원"].sum().unstack(fill_value=0)
+    table = table.reindex(range(1, 13), fill_value=0)
+    table.index = [f"{m:02d}월" for m in table.index]
+    table.columns = [f"{y}년" for y in table.columns]
+    return table
+
+def draw_trend_section(df_att, groups):
+    version = data_version(df_att)
+    groups_key = tuple(groups) if groups is not None else None
+
+    c1, c2, c3 = st.columns(3)
+    freq = c1.radio("단위", ["주간", "월간"], horizontal=True)
+    by = "소그룹" if c2.radio("기준", ["소그룹별", "모임별"], horizontal=True) == "소그룹별" else "모임명"
+    show_ma = c3.checkbox("이동평균으로 보기", value=True)
+
+    table = get_trend_table(version, df_att, freq, by, groups_key, tuple(get_meeting_config()["ordered"]))
+    if table.empty:
+        st.warning("추세를 계산할 출석 기록이 없습니다."); return
+
+    shown = st.multiselect(f"표시할 {by}", table.columns.tolist(), default=table.columns.tolist())
+    if shown:
+        chart = table[shown]
+        if show_ma:
+            window = 4 if freq == "주간" else 3
+            chart = chart.rolling(window, min_periods=1).mean()
+            st.caption(f"📉 최근 {window}{'주' if freq == '주간' else '개월'} 이동평균")
+        st.line_chart(chart)
+
+    st.divider()
+    st.markdown("##### 📅 연도별 비교 (월별 출석 인원)")
+    yoy = get_yoy_table(version, df_att, groups_key)
+    st.line_chart(yoy)
+    totals = yoy.sum()
+    summary = pd.DataFrame({"총 출석": totals, "전년 대비": (totals.pct_change() * 100).round(1).map(lambda x: "" if pd.isna(x) else f"{x:+.1f}%")})
+    st.dataframe(summary.T, use_container_width=True)
+
+# --- 3-3. 성도 검색 (초성·앞글자·부분 일치 색인) ---
+CHOSUNG_LIST = ["ㄱ", "ㄲ", "ㄴ", "ㄷ", "ㄸ", "ㄹ", "ㅁ", "ㅂ", "ㅃ", "ㅅ", "ㅆ", "ㅇ", "ㅈ", "ㅉ", "ㅊ", "ㅋ", "ㅌ", "ㅍ", "ㅎ"]
+CHOSUNG_INDEX = {c: i for i, c in enumerate(CHOSUNG_LIST)}
+SEARCH_PLACEHOLDER = "이름·초성(예: ㅎㄱㄷ)·전화번호·소그룹"
+
+def hangul_initial(ch):
+    """글자의 초성 (한글 음절이 아니면 그대로)"""
+    code = ord(ch) - 0xAC00
+    return CHOSUNG_LIST[code // 588] if 0 <= code < 11172 else ch
+
+def search_forms(text):
+    """색인할 때 한 번만 계산: 원래 글자 / 초성만 / 받침을 뺀 글자 (세 문자열의 길이는 같음)"""
+    raw = str(text).strip().casefold()
+    return {"raw": raw, "cho": "".join(map(hangul_initial, raw)),
+            "open": "".join(chr(ord(c) - (ord(c) - 0xAC00) % 28) if 0 <= ord(c) - 0xAC00 < 11172 else c for c in raw)}
+
+def search_tokens(query):
+    """'ㅎㄱㄷ', '홍기' 같이 입력 중인 글자도 맞도록 검색어 글자마다 비교할 형태를 정함"""
+    q = query.strip().casefold()
+    tokens = []
+    for pos, ch in enumerate(q):
+        code = ord(ch) - 0xAC00
+        # 초성 하나 -> 그 초성으로 시작하는 모든 글자
+        if ch in CHOSUNG_INDEX: tokens.append(("cho", ch))
+        # 마지막 글자에 받침이 없으면 받침이 붙은 글자까지 허용 (기 -> 길)
+        elif pos == len(q) - 1 and 0 <= code < 11172 and code % 28 == 0: tokens.append(("open", ch))
+        else: tokens.append(("raw", ch))
+    return tokens
+
+def find_tokens(forms, tokens):
+    """검색어가 처음 맞는 위치 (없으면 -1)"""
+    for start in range(len(forms["raw"]) - len(tokens) + 1):
+        if all(forms[kind][start + k] == ch for k, (kind, ch) in enumerate(tokens)): return start
+    return -1
+
+class MemberSearchIndex:
+    """명단 한 버전에 대해 한 번만 만드는 검색 색인 (글자 형태 미리 계산 + 첫 글자별 후보 목록)"""
+    def __init__(self, df_members):
+        self.labels = df_members.index.tolist()
+        self.raw_names = [str(x).strip() for x in df_members["이름"]]
+        self.names = [search_forms(x) for x in self.raw_names]
+        self.groups = [search_forms(x) for x in df_members["소그룹"]]
+        self.phones = [re.sub(r"\D", "", str(x)) for x in df_members["전화번호"]]
+        # 이름/소그룹 각 글자의 초성, 전화번호의 각 숫자 -> 그 글자가 들어 있는 성도 위치
+        self.by_initial = collections.defaultdict(set)
+        for pos in range(len(self.labels)):
+            for key in set(self.names[pos]["cho"]) | set(self.groups[pos]["cho"]) | set(self.phones[pos]):
+                self.by_initial[key].add(pos)
+        self.results = {}
+
+    def positions(self, query):
+        """일치하는 위치를 (이름 앞글자 > 이름 포함 > 소그룹 > 전화번호) 순으로 반환"""
+        q = query.strip()
+        if not q: return range(len(self.labels))
+        if q in self.results: return self.results[q]
+        tokens = search_tokens(q)
+        digits = re.sub(r"\D", "", q) if re.fullmatch(r"[\d\-\s]+", q) else ""
+        # 검색어 첫 글자의 초성(전화번호면 첫 숫자)이 들어 있는 성도만 비교
+        candidates = self.by_initial.get(hangul_initial(tokens[0][1]), set())
+        if digits: candidates = candidates | self.by_initial.get(digits[0], set())
+        hits = []
+        for pos in candidates:
+            at = find_tokens(self.names[pos], tokens)
+            if at >= 0: hits.append((0 if at == 0 else 1, pos)); continue
+            if find_tokens(self.groups[pos], tokens) >= 0: hits.append((2, pos)); continue
+            if digits and digits in self.phones[pos]: hits.append((3, pos))
+        hits.sort()
+        result = [pos for _, pos in hits]
+        if len(self.results) > 256: self.results.clear()
+        self.results[q] = result
+        return result
+
+    def search(self, query):
+        return [self.labels[pos] for pos in self.positions(query)]
+
+    def search_names(self, query):
+        return list(dict.fromkeys(self.raw_names[pos] for pos in self.positions(query)))
+
+@tenant_cache(max_entries=2)
+def get_member_index(version, _df_members):
+    return MemberSearchIndex(_df_members)
+
+def filter_members_by_search(df_members, subset, query):
+    """subset(명단의 일부) 중 검색어와 맞는 행만 순위대로 반환"""
+    if not query.strip(): return subset
+    labels = get_member_index(data_version(df_members), df_members).search(query)
+    return subset.loc[[l for l in labels if l in subset.index]]
+
+def filter_names_by_search(df_members, names, query):
+    """이름 목록 중 검색어와 맞는 이름만 순위대로 반환 (명단에 없는 이름은 글자로만 비교)"""
+    if not query.strip(): return names
+    index = get_member_index(data_version(df_members), df_members)
+    name_set = set(names)
+    result = [n for n in index.search_names(query) if n in name_set]
+    tokens = search_tokens(query)
+    member_names = set(index.raw_names)
+    return result + [n for n in names if n not in member_names and find_tokens(search_forms(n), tokens) >= 0]
+
+# --- 3-4. 기도제목·보고서 전체 검색 (글자 n-gram 역색인) ---
+TEXT_SEARCH_SOURCES = {"기도제목": "prayer_log", "사역 보고": "reports"}
+TEXT_SEARCH_LIMIT = 50
+
+def text_ngrams(text):
+    """단어별 글자 1-gram + 2-gram 빈도 (띄어쓰기/조사 차이에도 찾을 수 있도록)"""
+    grams = collections.Counter()
+    for word in re.findall(r"\w+", str(text).casefold()):
+        grams.update(word)
+        grams.update(word[i:i + 2] for i in range(len(word) - 1))
+    return grams
+
+class TextSearchIndex:
+    """'내용' 역색인. 데이터가 바뀌면 새로 생기거나 사라진 글만 반영함"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.postings = collections.defaultdict(dict)  # gram -> {글 키: 횟수}
+        self.doc_grams = {}                            # 글 키 -> gram 빈도
+        self.doc_rows = {}                             # 글 키 -> 현재 행 번호
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        state["postings"] = dict(state["postings"])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.postings = collections.defaultdict(dict, self.postings)
+        self.lock = threading.Lock()
+
+    def sync(self, df, version):
+        with self.lock:
+            if version == self.version: return
+            key_cols = [c for c in ["날짜", "이름", "작성자", "내용"] if c in df.columns]
+            # 행 번호는 저장할 때마다 바뀌므로 내용 기반 키로 글을 구분
+            # 같은 날 같은 글을 두 번 올린 경우도 따로 찾히도록 (내용 해시, 몇 번째 같은 글) 쌍으로
+            hashes = pd.util.hash_pandas_object(df[key_cols], index=False)
+            keys = list(zip(hashes.tolist(), hashes.groupby(hashes).cumcount().tolist())) if not df.empty else []
+            current = dict(zip(keys, df.index))
+            for key in self.doc_grams.keys() - current.keys():
+                for gram in self.doc_grams.pop(key):
+                    self.postings[gram].pop(key, None)
+                    if not self.postings[gram]: del self.postings[gram]
+            for key, label in current.items():
+                if key in self.doc_grams: continue
+                grams = text_ngrams(df.at[label, "내용"])
+                self.doc_grams[key] = grams
+                for gram, count in grams.items():
+                    self.postings[gram][key] = count
+            self.doc_rows = current
+            self.version = version
+
+    def search(self, query, allowed_rows=None):
+        """모든 검색 글자를 포함한 글의 (점수, 행 번호) 목록을 점수순으로 반환"""
+        q_grams = text_ngrams(query)
+        grams = [g for g in q_grams if len(g) == 2] or list(q_grams)
+        if not grams: return []
+        with self.lock:
+            lists = sorted((self.postings.get(g, {}) for g in grams), key=len)
+            if not lists[0]: return []
+            n_docs = len(self.doc_grams)
+            candidates = set(lists[0]).intersection(*lists[1:])
+            hits = []
+            for key in candidates:
+                row = self.doc_rows[key]
+                if allowed_rows is not None and row not in allowed_rows: continue
+                score = sum(self.postings[g][key] * math.log(1 + n_docs / len(self.postings[g])) for g in grams)
+                hits.append((score, row))
+        hits.sort(key=lambda x: -x[0])
+        return hits
+
+def get_text_index(sheet_name):
+    # 교회별 상태에 보관하여 오래 안 쓴 교회의 색인은 함께 정리됨
+    indexes = get_tenant_pool().state(current_tenant_id()).text_indexes
+    if sheet_name not in indexes:
+        # 미리 만든 색인이 있으면 그것부터 시작 (버전이 달라도 바뀐 글만 다시 색인됨)
+        try:
+            with open(snapshot_path(f"text_index_{sheet_name}.pkl"), "rb") as f: indexes[sheet_name] = pickle.load(f)
+        except Exception: indexes[sheet_name] = TextSearchIndex()
+    return indexes[sheet_name]
+
+def highlight_text(text, query):
+    safe = html.escape(str(text))
+    words = sorted({html.escape(w) for w in query.split()}, key=len, reverse=True)
+    if not words: return safe
+    return re.sub("|".join(map(re.escape, words)), lambda m: f"<mark>{m.group(0)}</mark>", safe, flags=re.IGNORECASE)
+
+def draw_text_search_tab(current_user, is_admin, is_viewer):
+    st.subheader("🔎 기도제목·보고서 검색")
+    st.markdown('<div class="info-tip">💡 <b>Tip:</b> 예전에 올라온 기도제목이나 보고서를 단어로 찾아보세요. (예: 수술, 취업, 이사)</div>', unsafe_allow_html=True)
+    if is_viewer:
+        st.warning("뷰어 계정은 기도제목/보고서를 볼 수 없습니다."); return
+
+    c1, c2 = st.columns([2, 1])
+    query = c1.text_input("검색어", key="text_search_q", placeholder="찾을 단어를 입력하세요")
+    sources = c2.multiselect("검색 범위", list(TEXT_SEARCH_SOURCES), default=list(TEXT_SEARCH_SOURCES))
+    if not is_admin: st.caption("🔒 본인이 작성한 글에서만 찾습니다.")
+    if not query.strip(): return
+
+    results = []
+    for source in sources:
+        sheet_name = TEXT_SEARCH_SOURCES[source]
+        df = load_data(sheet_name)
+        index = get_text_index(sheet_name)
+        index.sync(df, data_version(df))
+        # [v3.0] 권한: 관리자는 전체, 리더는 본인이 작성한 글만
+        allowed = None if is_admin else set(df.index[df["작성자"] == current_user["이름"]])
+        for score, row_label in index.search(query, allowed):
+            row = df.loc[row_label]
+            who = f"{row['이름']} ({row['소그룹']})" if source == "기도제목" else row["작성자"]
+            results.append({"점수": score, "날짜": str(row["날짜"]), "종류": source, "대상": who, "내용": row["내용"]})
+
+    if not results:
+        st.info("검색 결과가 없습니다."); return
+    results.sort(key=lambda r: (r["점수"], r["날짜"]), reverse=True)
+    st.caption(f"총 {len(results)}건" + (f" 중 상위 {TEXT_SEARCH_LIMIT}건" if len(results) > TEXT_SEARCH_LIMIT else ""))
+    for r in results[:TEXT_SEARCH_LIMIT]:
+        st.markdown(f"""<div class="report-card"><div class="report-header">🗓️ {r['날짜']} | {r['종류']} | 👤 {html.escape(str(r['대상']))}</div><div class="report-content">{highlight_text(r['내용'], query)}</div></div>""", unsafe_allow_html=True)
+
+# --- 3-5. 간편 출석 (휴대폰용: 명단은 한 번만 받고, 바뀐 출석만 보냄) ---
+QUICK_CHECK_HTML = """<!doctype html>
+<html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">
+<style>
+body { margin: 0; font-family: 'Pretendard', sans-serif; font-size: 15px; color: #333; }
+#q { width: 100%; box-sizing: border-box; padding: 10px; margin-bottom: 8px; border: 1px solid #ddd; border-radius: 8px; font-size: 15px; }
+.row { display: flex; align-items: center; gap: 6px; padding: 8px 2px; border-bottom: 1px solid #f0f0f0; }
+.name { flex: 1; min-width: 0; }
+.name b { font-weight: 600; }
+.name small { color: #999; margin-left: 4px; }
+.chip { border: 1px solid #ccc; background: #fff; border-radius: 16px; padding: 7px 10px; font-size: 13px; color: #666; }
+.chip.on { background: #4CAF50; border-color: #4CAF50; color: #fff; }
+.chip.changed { box-shadow: 0 0 0 2px #FFB74D; }
+.bar { position: sticky; bottom: 0; display: flex; align-items: center; justify-content: space-between; gap: 8px; padding: 10px 2px; background: #fff; border-top: 1px solid #eee; }
+#save { border: none; border-radius: 8px; padding: 10px 18px; background: #2E7D32; color: #fff; font-size: 15px; font-weight: 600; }
+#save:disabled { background: #ccc; }
+</style></head>
+<body>
+<input id="q" placeholder="🔍 이름 검색">
+<div id="list"></div>
+<div class="bar"><span id="count"></span><button id="save" disabled>✅ 저장</button></div>
+<script>
+const send = (type, data) => window.parent.postMessage(Object.assign({ isStreamlitMessage: true, type: type }, data), "*");
+const qbox = document.getElementById("q"), list = document.getElementById("list");
+const count = document.getElementById("count"), save = document.getElementById("save");
+let roster = null, index = new Map(), pending = new Map(), sent = null;
+// 날짜/소그룹/모임 조합(scope)마다 바뀐 출석을 따로 보관 (다른 소그룹을 보고 돌아와도 그대로 남음)
+const pendingByScope = new Map();
+
+// 바뀐 출석은 "이름\\t모임명" -> 출석여부 로만 기억 (원래 값으로 되돌리면 목록에서 빠짐)
+const keyOf = (name, meeting) => name + "\\t" + meeting;
+const baseOf = (name, j) => index.has(name) && ((roster.marks[index.get(name)] >> j) & 1) === 1;
+const isOn = (name, j) => { const k = keyOf(name, roster.meetings[j]); return pending.has(k) ? pending.get(k) : baseOf(name, j); };
+
+function paint(btn, name, j) {
+  btn.classList.toggle("on", isOn(name, j));
+  btn.classList.toggle("changed", pending.has(keyOf(name, roster.meetings[j])));
+}
+function update() {
+  save.disabled = sent !== null || pending.size === 0;
+  count.textContent = sent !== null ? "저장 중..." : (pending.size ? "바뀐 출석 " + pending.size + "건" : "바뀐 출석 없음");
+}
+function resize() { send("streamlit:setFrameHeight", { height: document.body.scrollHeight }); }
+function draw() {
+  list.textContent = "";
+  const q = qbox.value.trim();
+  roster.members.forEach(function (m) {
+    const name = m[0];
+    if (q && !name.includes(q)) return;
+    const row = document.createElement("div"); row.className = "row";
+    const label = document.createElement("div"); label.className = "name";
+    const b = document.createElement("b"); b.textContent = (m[2] ? "🟢 " : "⚪ ") + name;
+    const s = document.createElement("small"); s.textContent = roster.groups[m[1]];
+    label.append(b, s); row.append(label);
+    roster.meetings.forEach(function (meeting, j) {
+      const btn = document.createElement("button"); btn.className = "chip"; btn.textContent = meeting;
+      btn.onclick = function () {
+        const k = keyOf(name, meeting), next = !isOn(name, j);
+        if (next === baseOf(name, j)) pending.delete(k); else pending.set(k, next);
+        paint(btn, name, j); update();
+      };
+      paint(btn, name, j); row.append(btn);
+    });
+    list.append(row);
+  });
+  update(); resize();
+}
+qbox.oninput = draw;
+save.onclick = function () {
+  const changes = [];
+  pending.forEach(function (present, k) { const p = k.split("\\t"); changes.push([p[0], p[1], present]); });
+  sent = Date.now().toString(36) + Math.random().toString(36).slice(2, 8);
+  update();
+  send("streamlit:setComponentValue", { value: { nonce: sent, scope: roster.scope, changes: changes }, dataType: "json" });
+};
+window.addEventListener("message", function (e) {
+  if (!e.data || e.data.type !== "streamlit:render") return;
+  const args = e.data.args, ack = args.ack || {};
+  if (sent !== null && ack.nonce === sent) { if (ack.ok) pending.clear(); sent = null; }
+  if (!roster || roster.scope !== args.scope) {
+    if (!pendingByScope.has(args.scope)) pendingByScope.set(args.scope, new Map());
+    pending = pendingByScope.get(args.scope);
+  }
+  roster = args;
+  index = new Map(roster.members.map(function (m, i) { return [m[0], i]; }));
+  // 다른 사람이 먼저 같은 값으로 저장했으면 보낼 필요 없음
+  pending.forEach(function (present, k) {
+    const p = k.split("\\t"), j = roster.meetings.indexOf(p[1]);
+    if (j < 0 || !index.has(p[0]) || baseOf(p[0], j) === present) pending.delete(k);
+  });
+  draw();
+});
+send("streamlit:componentReady", { apiVersion: 1 });
+</script></body></html>
+"""
+
+@st.cache_resource(show_spinner=False)
+def get_quick_check_component():
+    """간편 출석 화면(HTML 한 장)을 임시 폴더에 풀어 놓고 컴포넌트로 등록"""
+    path = os.path.join(tempfile.gettempdir(), "church_quick_check_" + hashlib.sha1(QUICK_CHECK_HTML.encode("utf-8")).hexdigest()[:10])
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "index.html"), "w", encoding="utf-8") as f: f.write(QUICK_CHECK_HTML)
+    return components.declare_component("quick_attendance", path=path)
+
+def compact_roster(targets, df_att, chk_date, target_meetings):
+    """명단을 [이름, 소그룹 번호, 활동 여부] + 모임별 출석 비트로 압축 (열 이름/상태 문자열을 매 줄 반복하지 않음)"""
+    day_log = df_att[(df_att["날짜"] == str(chk_date)) & df_att["모임명"].isin(target_meetings)]
+    present = {m: set(names) for m, names in day_log.groupby("모임명")["이름"]}
+    groups = sorted(targets["소그룹"].astype(str).unique().tolist())
+    group_idx = {g: i for i, g in enumerate(groups)}
+    members, marks = [], []
+    for name, grp, status in zip(targets["이름"].astype(str), targets["소그룹"].astype(str), targets["상태"].astype(str)):
+        members.append([name, group_idx[grp], 1 if status.startswith("🟢") else 0])
+        marks.append(sum(1 << j for j, m in enumerate(target_meetings) if name in present.get(m, ())))
+    return {"groups": groups, "members": members, "marks": marks}
+
+def apply_attendance_changes(chk_date, changes, member_groups, allowed_meetings):
+    """바뀐 (이름, 모임, 출석여부)만 반영. 같은 요청을 여러 번 보내도 결과가 같음
+    추가는 append_rows 한 번, 취소는 해당 행만 batch_update 한 번 (전체 시트를 다시 쓰지 않음)"""
+    changes = {(str(n), str(m)): bool(p) for n, m, p in changes if n in member_groups and m in allowed_meetings}
+    if not changes: return 0, 0
+    budget = get_request_budget()
+    with budget.sheet_lock("attendance_log"):
+        # 쓰기 한도(삭제 + 추가 = 2회)를 먼저 확보: 읽은 뒤에 기다리면 그사이 행 번호가 바뀔 수 있음
+        if not budget.acquire("write", 2, max_wait=QUOTA_MAX_WAIT_WRITE): return None
+        # 몇 년 치 기록 전체를 다시 받지 않고 공유 보관소의 프레임에서 시작 (이 서버의 저장은 모두 이 잠금과 보관소를 거침)
+        # 다른 프로세스가 시트를 바꾼 경우는 아래 삭제 직전 확인(batch_get)이 잡아냄
+        df = load_data("attendance_log")
+        # 읽기 실패 때 돌려주는 빈 표나 예전 사본을 바탕으로는 저장하지 않음
+        if budget.version_of(df) is None or budget.is_stale("attendance_log"): return None
+        on_day = df[df["날짜"] == str(chk_date)]
+        existing = collections.defaultdict(list)
+        for idx, name, meeting in zip(on_day.index, on_day["이름"], on_day["모임명"]): existing[(name, meeting)].append(idx)
+
+        new_records = [{"날짜": str(chk_date), "모임명": m, "이름": n, "소그룹": member_groups[n], "출석여부": "출석"}
+                       for (n, m), present in changes.items() if present and (n, m) not in existing]
+        drop_idx = sorted(i for (n, m), present in changes.items() if not present for i in existing.get((n, m), []))
+        if not new_records and not drop_idx: return 0, 0
+
+        updated = pd.concat([df.drop(drop_idx), pd.DataFrame(new_records, columns=df.columns)], ignore_index=True)
+        if df.empty:
+            return (len(new_records), 0) if save_data("attendance_log", updated) else None
+
+        ws = get_worksheet("attendance_log")
+        if not ws: return None
+        try:
+            if drop_idx:
+                # 연속된 행끼리 묶어 아래쪽부터 삭제 (DataFrame 0번 행 = 시트 2행 = 0부터 세면 1)
+                runs = []
+                for i in drop_idx:
+                    if runs and runs[-1][1] == i: runs[-1][1] = i + 1
+                    else: runs.append([i, i + 1])
+                # 지우기 직전에 해당 행을 다시 읽어 날짜/이름/모임명이 그대로인지 확인 (명령줄 작업 등 다른 프로세스 대비)
+                if not budget.acquire("read"): return None
+                cols = [df.columns.get_loc(c) for c in ("날짜", "이름", "모임명")]
+                current = [row for block in ws.batch_get([f"{s + 2}:{e + 1}" for s, e in runs]) for row in block]
+                expected = df.loc[drop_idx].iloc[:, cols].astype(str).values.tolist()
+                pad = max(cols) + 1
+                if len(current) != len(expected) or any([(r + [""] * pad)[c] for c in cols] != exp for r, exp in zip(current, expected)):
+                    invalidate_data("attendance_log")
+                    return None
+                ws.spreadsheet.batch_update({"requests": [
+                    {"deleteDimension": {"range": {"sheetId": ws.id, "dimension": "ROWS", "startIndex": s + 1, "endIndex": e + 1}}}
+                    for s, e in reversed(runs)]})
+            if new_records:
+                rows = pd.DataFrame(new_records, columns=df.columns)
+                ws.append_rows(rows.astype(object).where(rows.notna(), "").values.tolist())
+        except gspread.exceptions.APIError:
+            budget.penalize("write")
+            budget.worksheets.pop("attendance_log", None)
+            invalidate_data("attendance_log")
+            return None
+        budget.remember("attendance_log", freeze_frame(updated))
+        return len(new_records), len(drop_idx)
+
+@st.fragment
+def draw_quick_attendance(targets, chk_date, day_str, grp, target_meetings):
+    df_att = load_data("attendance_log")
+    # 소그룹마다 따로 (같은 주일 모임을 쓰는 다른 소그룹으로 바꿔도 체크해 둔 내용이 섞이거나 사라지지 않음)
+    scope = f"{chk_date}|{grp}|{'|'.join(target_meetings)}"
+    roster = compact_roster(targets, df_att, chk_date, target_meetings)
+    value = get_quick_check_component()(
+        scope=scope, meetings=list(target_meetings), ack=st.session_state.get("quick_att_ack"),
+        key=f"quick_att_{scope}", default=None, **roster)
+
+    # 컴포넌트는 마지막 값을 계속 돌려주므로 처리한 요청 번호(nonce)를 기억해 두고 한 번만 반영
+    done = st.session_state.setdefault("quick_att_done", collections.deque(maxlen=64))
+    if value and value.get("scope") == scope and value.get("nonce") not in done:
+        done.append(value["nonce"])
+        member_groups = dict(zip(targets["이름"].astype(str), targets["소그룹"].astype(str)))
+        result = apply_attendance_changes(chk_date, value.get("changes") or [], member_groups, set(target_meetings))
+        st.session_state["quick_att_ack"] = {"nonce": value["nonce"], "ok": result is not None}
+        if result is None: st.session_state["quick_att_msg"] = ("error", "⚠️ 접속량이 많거나 다른 곳에서 출석부가 바뀌어 저장하지 못했습니다. 바뀐 출석은 그대로 있으니 잠시 후 다시 저장해주세요.")
+        else: st.session_state["quick_att_msg"] = ("success", f"✅ {chk_date} ({day_str}) 출석 {result[0]}건 추가, {result[1]}건 취소 완료!")
+        st.rerun(scope="fragment")
+
+    msg = st.session_state.pop("quick_att_msg", None)
+    if msg: getattr(st, msg[0])(msg[1])
 
 # --- 로그인 & 회원가입 로직 ---
 def process_login(username, password, cookie_manager):
@@ -381,13 +1570,16 @@ def process_login(username, password, cookie_manager):
         st.session_state["logged_in"] = True
         st.session_state["user_info"] = matched.iloc[0].to_dict()
         exp = datetime.datetime.now() + datetime.timedelta(days=30)
-        cookie_manager.set("church_user_id", username, expires_at=exp)
+        cookie_manager.set(login_cookie_name(), username, expires_at=exp)
         st.rerun()
     else: st.error("아이디 또는 비밀번호가 일치하지 않습니다.")
 
 def process_signup(reg_name, reg_id, reg_pw):
-    ws = get_worksheet("users")
+    ws = get_worksheet("users", writing=True)
     if not ws: return
+    budget = get_request_budget()
+    if not budget.acquire("read", 2) or not budget.acquire("write", 2, max_wait=QUOTA_MAX_WAIT_WRITE):
+        st.error("⚠️ 접속량이 많아 일시적으로 지연됩니다. 잠시 후 다시 시도해주세요."); return
     try: cell = ws.find(reg_name) 
     except gspread.exceptions.CellNotFound:
         st.error(f"❌ '{reg_name}'님은 명단에 없습니다. 관리자에게 문의해주세요."); return
@@ -396,21 +1588,22 @@ def process_signup(reg_name, reg_id, reg_pw):
     if existing_id and str(existing_id).strip() != "":
         st.error("❌ 이미 등록된 계정이 있습니다. 분실 시 관리자에게 초기화를 요청하세요."); return
     ws.update_cell(row_num, 1, reg_id); ws.update_cell(row_num, 2, reg_pw) 
-    load_data.clear()
+    invalidate_data("users")
     st.success(f"✅ 환영합니다, {reg_name}님! 계정이 생성되었습니다."); st.info("이제 [🔑 로그인] 메뉴로 이동하여 로그인해주세요.")
 
 def process_logout(cookie_manager):
     st.session_state["logged_in"] = False
     st.session_state["user_info"] = None
-    try: cookie_manager.delete("church_user_id")
+    try: cookie_manager.delete(login_cookie_name())
     except: pass
     with st.spinner("로그아웃 중입니다..."): time.sleep(1)
     st.rerun()
 
 # --- 4. 메인 앱 ---
 def main():
+    st.title(f"⛪ {get_tenant_config()['name']} 출석체크 시스템 v3.3")
+    mark_timing("first_paint")
     cookie_manager = stx.CookieManager(key="church_cookies")
-    st.title("⛪ 회정교회 출석체크 시스템 v3.3")
 
     if "logged_in" not in st.session_state:
         st.session_state["logged_in"] = False
@@ -418,7 +1611,7 @@ def main():
 
     if not st.session_state["logged_in"]:
         time.sleep(0.5)
-        cookie_id = cookie_manager.get(cookie="church_user_id")
+        cookie_id = cookie_manager.get(cookie=login_cookie_name())
         if cookie_id:
             df_users = load_data("users")
             match = df_users[df_users["아이디"].astype(str) == str(cookie_id)]
@@ -429,6 +1622,14 @@ def main():
 
     with st.sidebar:
         if not st.session_state["logged_in"]:
+            registry = get_tenant_registry()
+            if len(registry) > 1:
+                tenant_ids = list(registry)
+                picked = st.selectbox("⛪ 교회 선택", tenant_ids, index=tenant_ids.index(current_tenant_id()), format_func=lambda t: registry[t]["name"])
+                if picked != current_tenant_id():
+                    st.query_params["church"] = picked
+                    st.session_state["tenant_id"] = picked
+                    st.rerun()
             mode = st.radio("접속 모드", ["🔑 로그인", "✨ 계정 생성"], index=0)
             st.divider()
             if mode == "🔑 로그인":
@@ -447,11 +1648,20 @@ def main():
                     if not reg_name or not reg_id or not reg_pw: st.warning("모든 정보를 입력해주세요.")
                     elif reg_pw != reg_pw_chk: st.error("비밀번호가 일치하지 않습니다.")
                     else: process_signup(reg_name, reg_id, reg_pw)
+            mark_timing("login_box")
         else:
             u = st.session_state["user_info"]
             st.success(f"👤 {u['이름']}님 환영합니다")
             st.caption(f"권한: {u['역할']}")
             if st.button("로그아웃", use_container_width=True): process_logout(cookie_manager)
+            if str(u.get("역할", "")).lower().strip() == "admin":
+                budget = get_request_budget()
+                st.divider()
+                st.caption("📶 구글 API 남은 한도 (분당)")
+                m1, m2 = st.columns(2)
+                m1.metric("읽기", f"{budget.remaining('read')}/{READ_QUOTA_PER_MIN}")
+                m2.metric("쓰기", f"{budget.remaining('write')}/{WRITE_QUOTA_PER_MIN}")
+                st.caption(f"대기 초과 {budget.stats['throttled']}회 · 이전 데이터 사용 {budget.stats['stale_served']}회 · API 오류 {budget.stats['api_errors']}회")
 
     if not st.session_state["logged_in"]:
         st.info("👈 왼쪽 사이드바에서 로그인하거나 계정을 생성해주세요.")
@@ -470,8 +1680,9 @@ def main():
     df_prayer = load_data("prayer_log")
     df_reports = load_data("reports")
 
-    menu = ["🏠 홈", "📖 사용설명서", "📋 출석체크", "📊 통계", "🙏 기도제목", "📨 사역 보고", "👥 명단 관리", "🛠️ 개발 로그"]
-    if is_admin: menu.insert(7, "🔐 계정 관리")
+    menu = ["🏠 홈", "📖 사용설명서", "📋 출석체크", "📊 통계", "📦 자료 내보내기", "🙏 기도제목", "📨 사역 보고", "👥 명단 관리", "🛠️ 개발 로그"]
+    if not is_viewer: menu.insert(menu.index("📨 사역 보고") + 1, "🔎 기록 검색")
+    if is_admin: menu.insert(menu.index("🛠️ 개발 로그"), "🔐 계정 관리")
     
     sel_menu = st.radio("메뉴", menu, horizontal=True, label_visibility="collapsed")
     st.divider()
@@ -517,8 +1728,7 @@ def main():
 
             if not targets.empty:
                 active_members = set(df_att["이름"].unique())
-                targets = targets.copy()
-                targets["상태"] = targets["이름"].apply(lambda x: "🟢 활동" if x in active_members else "⚪ 장기결석")
+                targets = targets.assign(상태=targets["이름"].apply(lambda x: "🟢 활동" if x in active_members else "⚪ 장기결석"))
                 
                 st.markdown('<div class="info-tip">💡 <b>Tip:</b> <b>\'🌱 출석유무순\'</b>을 선택하면 자주 오는 성도님이 위쪽에 표시되어 찾기 쉽습니다.</div>', unsafe_allow_html=True)
                 sort_chk = st.radio("명단 정렬 기준:", ["🌱 출석유무순 (추천)", "👨‍👩‍👧‍👦 가족순", "🔤 이름순"], horizontal=True)
@@ -531,59 +1741,50 @@ def main():
                 elif sort_chk == "🔤 이름순":
                     targets = targets.sort_values(by="이름")
 
-                current_log = df_att[df_att["날짜"] == str(chk_date)]
-                grid_data = []
-                for _, member in targets.iterrows():
-                    row = {
-                        "이름": member["이름"], 
-                        "소그룹": member["소그룹"], 
-                        "상태": member["상태"]
-                    } 
-                    member_log = current_log[current_log["이름"] == member["이름"]]
-                    for col in target_meetings:
-                        row[col] = not member_log[member_log["모임명"] == col].empty
-                    grid_data.append(row)
+                # 휴대폰용 간편 모드: 표 전체 대신 바뀐 출석만 주고받음
+                if st.toggle("📱 간편 모드 (휴대폰용)", key="att_quick_mode", help="명단은 처음 한 번만 받고, 저장할 때는 바뀐 출석만 보냅니다."):
+                    st.success(f"📌 {grp} / {', '.join(target_meetings)} 출석을 체크합니다. 이름 옆 모임을 눌러 표시한 뒤 저장하세요.")
+                    draw_quick_attendance(targets, chk_date, day_str, grp, target_meetings)
+                else:
+                    current_log = df_att[df_att["날짜"] == str(chk_date)]
+                    grid_data = []
+                    for _, member in targets.iterrows():
+                        row = {
+                            "이름": member["이름"], 
+                            "소그룹": member["소그룹"], 
+                            "상태": member["상태"]
+                        } 
+                        member_log = current_log[current_log["이름"] == member["이름"]]
+                        for col in target_meetings:
+                            row[col] = not member_log[member_log["모임명"] == col].empty
+                        grid_data.append(row)
                 
-                df_grid = pd.DataFrame(grid_data)
+                    df_grid = pd.DataFrame(grid_data)
                 
-                col_conf = {
-                    "이름": st.column_config.TextColumn("이름", disabled=True, pinned=True),
-                    "상태": st.column_config.TextColumn("상태", disabled=True, width="small"),
-                    "소그룹": st.column_config.TextColumn("소그룹", disabled=True)
-                }
-                for col in target_meetings:
-                    col_conf[col] = st.column_config.CheckboxColumn(col, default=False)
-
-                st.success(f"📌 {grp} / {', '.join(target_meetings)} 출석을 체크합니다.")
-                edited_df = st.data_editor(df_grid, column_config=col_conf, hide_index=True, use_container_width=True)
-
-                if st.button("✅ 출석 저장하기", use_container_width=True):
-                    mask_date = df_att["날짜"] == str(chk_date)
-                    mask_grp = df_att["소그룹"] == grp if grp != "전체 보기" else True
-                    mask_meeting = df_att["모임명"].isin(target_meetings)
-                    df_clean = df_att[~(mask_date & mask_grp & mask_meeting)]
-                    new_records = []
-                    for _, row in edited_df.iterrows():
-                        name = row["이름"]
-                        u_grp = row["소그룹"]
-                        for col in target_meetings:
-                            if row[col]:
-                                new_records.append({
-                                    "날짜": str(chk_date), "모임명": col, "이름": name, "소그룹": u_grp, "출석여부": "출석"
-                                })
-                    final_df = pd.concat([df_clean, pd.DataFrame(new_records)], ignore_index=True)
-                    save_data("attendance_log", final_df)
-                    st.success(f"✅ {chk_date} ({day_str}) 출석 저장 완료!"); st.rerun()
+                    col_conf = {
+                        "이름": st.column_config.TextColumn("이름", disabled=True, pinned=True),
+                        "상태": st.column_config.TextColumn("상태", disabled=True, width="small"),
+                        "소그룹": st.column_config.TextColumn("소그룹", disabled=True)
+                    }
+                    for col in target_meetings:
+                        col_conf[col] = st.column_config.CheckboxColumn(col, default=False)
+
+                    st.success(f"📌 {grp} / {', '.join(target_meetings)} 출석을 체크합니다.")
+                    draw_attendance_grid(df_grid, col_conf, chk_date, day_str, grp, target_meetings)
 
     elif sel_menu == "📊 통계":
         st.subheader("📊 출석 누적 현황 및 상세 조회")
         st.markdown('<div class="info-tip">💡 <b>Tip:</b> 기간을 설정하여 출석 현황을 한눈에 보세요. 지난주 출석을 수정하려면 <b>하단 수정 메뉴</b>를 이용하세요.</div>', unsafe_allow_html=True)
 
+        stat_view = st.radio("보기", ["📋 출석 현황", "📈 추세 분석"], horizontal=True, label_visibility="collapsed")
+        if is_admin or is_viewer: trend_groups = None
+        else: trend_groups = [g.strip() for g in str(current_user["담당소그룹"]).split(",") if g.strip()]
+
         if df_att.empty: st.info("데이터가 없습니다.")
+        elif stat_view == "📈 추세 분석": draw_trend_section(df_att, trend_groups)
         else:
-            if "날짜" not in df_att.columns: df_att["날짜"] = ""
-            df_stat = df_att.copy()
-            df_stat["날짜"] = pd.to_datetime(df_stat["날짜"], errors='coerce')
+            if "날짜" not in df_att.columns: df_att = df_att.assign(날짜="")
+            df_stat = df_att.assign(날짜=pd.to_datetime(df_att["날짜"], errors='coerce'))
             
             c1, c2 = st.columns([2, 1])
             today = datetime.date.today()
@@ -623,16 +1824,20 @@ def main():
                     st.divider()
                     st.markdown(f"##### 📈 {s_grp} 출석 누적 현황표")
                     pivot_table = pd.crosstab(w_df["이름"], w_df["모임명"])
-                    for m_type in ALL_MEETINGS_ORDERED:
+                    meeting_order = get_meeting_config()["ordered"]
+                    for m_type in meeting_order:
                         if m_type not in pivot_table.columns: pivot_table[m_type] = 0
-                    pivot_table = pivot_table[[c for c in ALL_MEETINGS_ORDERED if c in pivot_table.columns]]
+                    pivot_table = pivot_table[[c for c in meeting_order if c in pivot_table.columns]]
                     st.dataframe(pivot_table, use_container_width=True)
                     
                     st.divider()
                     st.markdown("##### 🔍 개인별 상세 출석 수정")
                     if not pivot_table.empty:
                         name_list = sorted(pivot_table.index.tolist())
-                        selected_name = st.selectbox("수정할 이름 선택", name_list)
+                        name_q = st.text_input("🔍 이름 검색", key="stat_search", placeholder=SEARCH_PLACEHOLDER)
+                        found = filter_names_by_search(df_members, name_list, name_q)
+                        if name_q.strip() and not found: st.caption("검색 결과가 없어 전체 명단을 보여드립니다.")
+                        selected_name = st.selectbox("수정할 이름 선택", found or name_list)
                         if selected_name:
                             person_log = w_df[w_df["이름"] == selected_name].sort_values(by="날짜", ascending=False)
                             person_log["날짜"] = person_log["날짜"].apply(lambda x: f"{x.strftime('%Y-%m-%d')} {get_day_name(x)}")
@@ -644,17 +1849,21 @@ def main():
                             if st.button("💾 수정사항 저장하기", use_container_width=True):
                                 df_rest = df_att[df_att["이름"] != selected_name]
                                 new_person_data = []
-                                for _, row in edited_log.iterrows():
-                                    if row["날짜"] and row["모임명"]:
-                                        clean_date = row["날짜"].split(" ")[0]
+                                # 새로 추가한 행의 빈 칸은 <NA>(Arrow 문자열)일 수 있으므로 빈 문자열로 바꿔서 판단
+                                for _, row in edited_log.fillna("").iterrows():
+                                    if str(row["날짜"]).strip() and str(row["모임명"]).strip():
+                                        clean_date = str(row["날짜"]).split(" ")[0]
                                         new_person_data.append({
                                             "날짜": clean_date, "모임명": row["모임명"],
                                             "이름": selected_name, "소그룹": row["소그룹"],
                                             "출석여부": "출석"
                                         })
                                 final_df = pd.concat([df_rest, pd.DataFrame(new_person_data)], ignore_index=True)
-                                save_data("attendance_log", final_df)
-                                st.success(f"✅ {selected_name}님의 기록 업데이트 완료!"); st.rerun()
+                                if save_data("attendance_log", final_df):
+                                    st.success(f"✅ {selected_name}님의 기록 업데이트 완료!"); st.rerun()
+
+    elif sel_menu == "📦 자료 내보내기":
+        draw_export_tab(current_user, is_admin, is_viewer)
 
     elif sel_menu == "🙏 기도제목":
         st.subheader("기도제목 관리")
@@ -667,9 +1876,8 @@ def main():
             sun, sat = get_week_range(p_date)
             c2.caption(f"📅 조회 기간: {sun.strftime('%Y-%m-%d')} ~ {sat.strftime('%Y-%m-%d')}")
             
-            df_prayer_stat = df_prayer.copy()
-            df_prayer_stat["날짜"] = pd.to_datetime(df_prayer_stat["날짜"], errors='coerce')
-            mask = (df_prayer_stat["날짜"] >= pd.Timestamp(sun)) & (df_prayer_stat["날짜"] <= pd.Timestamp(sat))
+            p_dates = pd.to_datetime(df_prayer["날짜"], errors='coerce')
+            mask = (p_dates >= pd.Timestamp(sun)) & (p_dates <= pd.Timestamp(sat))
             weekly_prayers = df_prayer[mask].sort_values(by=["소그룹", "이름"])
             
             if weekly_prayers.empty: st.info("해당 주간에 등록된 기도제목이 없습니다.")
@@ -683,8 +1891,8 @@ def main():
                         with col_act:
                             if st.button("🗑️", key=f"adm_p_del_{i}"):
                                 df_prayer = df_prayer.drop(i)
-                                save_data("prayer_log", df_prayer)
-                                st.success("삭제됨"); time.sleep(0.5); st.rerun()
+                                if save_data("prayer_log", df_prayer):
+                                    st.success("삭제됨"); time.sleep(0.5); st.rerun()
                         st.divider()
 
         else:
@@ -695,7 +1903,10 @@ def main():
             else: p_grp = None
             if p_grp:
                 mems = df_members[df_members["소그룹"]==p_grp]["이름"].tolist()
-                p_who = st.selectbox("이름", mems)
+                p_q = st.text_input("🔍 이름 검색", key="prayer_search", placeholder=SEARCH_PLACEHOLDER)
+                found = filter_names_by_search(df_members, mems, p_q)
+                if p_q.strip() and not found: st.caption("검색 결과가 없어 전체 명단을 보여드립니다.")
+                p_who = st.selectbox("이름", found or mems)
                 
                 with st.expander("새 기도제목 입력", expanded=True):
                     with st.form("p_form", clear_on_submit=True):
@@ -703,8 +1914,8 @@ def main():
                         pc_in = st.text_area("내용")
                         if st.form_submit_button("저장"):
                             new_p = pd.DataFrame([{"날짜":str(pd_in), "이름":p_who, "소그룹":p_grp, "내용":pc_in, "작성자":current_user_name}])
-                            save_data("prayer_log", pd.concat([df_prayer, new_p], ignore_index=True))
-                            st.success("저장됨"); time.sleep(0.5); st.rerun()
+                            if save_data("prayer_log", pd.concat([df_prayer, new_p], ignore_index=True)):
+                                st.success("저장됨"); time.sleep(0.5); st.rerun()
                             
                 st.divider()
                 st.caption(f"{p_who}님의 히스토리")
@@ -717,41 +1928,12 @@ def main():
                 hist = my_prayers.sort_values("날짜", ascending=False)
                 
                 for i, r in hist.iterrows():
-                    if st.session_state.get(f"pray_edit_{i}", False):
-                        with st.form(f"pray_form_{i}"):
-                            st.caption(f"📝 기도제목 수정 (No.{i})")
-                            edit_p_date = st.date_input("날짜", pd.to_datetime(r['날짜']))
-                            edit_p_content = st.text_area("내용", r['내용'])
-                            c_save, c_cancel = st.columns(2)
-                            if c_save.form_submit_button("💾 수정 저장"):
-                                df_prayer.at[i, '날짜'] = str(edit_p_date)
-                                df_prayer.at[i, '내용'] = edit_p_content
-                                save_data("prayer_log", df_prayer)
-                                st.session_state[f"pray_edit_{i}"] = False
-                                st.success("수정되었습니다."); time.sleep(0.5); st.rerun()
-                            if c_cancel.form_submit_button("취소"):
-                                st.session_state[f"pray_edit_{i}"] = False
-                                st.rerun()
-                    else:
-                        col_content, col_btns = st.columns([8, 3]) 
-                        with col_content:
-                            st.info(f"**{r['날짜']}**: {r['내용']}")
-                        with col_btns:
-                            b1, b2 = st.columns(2)
-                            with b1:
-                                if st.button("✏️ 수정", key=f"p_edit_{i}"):
-                                    st.session_state[f"pray_edit_{i}"] = True
-                                    st.rerun()
-                            with b2:
-                                if st.button("🗑️ 삭제", key=f"p_del_{i}"):
-                                    df_prayer = df_prayer.drop(i)
-                                    save_data("prayer_log", df_prayer)
-                                    st.success("삭제됨"); time.sleep(0.5); st.rerun()
+                    draw_prayer_card(i, r)
 
     elif sel_menu == "📨 사역 보고":
         st.subheader("📨 소그룹 사역 보고")
         st.markdown('<div class="info-tip">💡 <b>Tip:</b> 매주 소그룹 사역 내용을 적어주세요. 목사님의 답변도 여기서 확인할 수 있습니다.</div>', unsafe_allow_html=True)
-        if "답변" not in df_reports.columns: df_reports["답변"] = ""
+        if "답변" not in df_reports.columns: df_reports = df_reports.assign(답변="")
         
         if is_admin:
             st.markdown("### 📥 관리자 모드: 보고서 확인 및 답변 작성")
@@ -760,31 +1942,14 @@ def main():
             sun, sat = get_week_range(r_date_adm)
             c2.caption(f"📅 조회 기간: {sun.strftime('%Y-%m-%d')} ~ {sat.strftime('%Y-%m-%d')}")
             
-            df_rep_stat = df_reports.copy()
-            df_rep_stat["날짜"] = pd.to_datetime(df_rep_stat["날짜"], errors='coerce')
-            mask = (df_rep_stat["날짜"] >= pd.Timestamp(sun)) & (df_rep_stat["날짜"] <= pd.Timestamp(sat))
+            r_dates = pd.to_datetime(df_reports["날짜"], errors='coerce')
+            mask = (r_dates >= pd.Timestamp(sun)) & (r_dates <= pd.Timestamp(sat))
             weekly_reports = df_reports[mask].sort_values(by="날짜", ascending=False)
             
             if weekly_reports.empty: st.info("해당 주간에 제출된 보고서가 없습니다.")
             else:
                 for i, row in weekly_reports.iterrows():
-                    with st.container():
-                        st.markdown(f"""<div class="report-card"><div class="report-header">🗓️ {row['날짜']} | 👤 {row['작성자']}</div><div class="report-content">{row['내용']}</div></div>""", unsafe_allow_html=True)
-                        new_ans = st.text_area(f"💬 {row['작성자']}님 보고에 대한 피드백 작성", value=row['답변'], key=f"ans_{i}", height=70)
-                        
-                        c_save, c_del = st.columns([1, 1])
-                        with c_save:
-                            if st.button("답변 저장", key=f"btn_{i}"):
-                                original_idx = row.name 
-                                df_reports.at[original_idx, "답변"] = new_ans
-                                save_data("reports", df_reports)
-                                st.success(f"✅ {row['작성자']}님에게 답변을 저장했습니다!"); time.sleep(1); st.rerun()
-                        with c_del:
-                            if st.button("🗑️ 보고서 삭제", key=f"adm_del_{i}"):
-                                df_reports = df_reports.drop(row.name)
-                                save_data("reports", df_reports)
-                                st.success("삭제되었습니다."); time.sleep(0.5); st.rerun()
-                        st.divider()
+                    draw_admin_report_card(i, row)
         else:
             st.markdown(f"### 📂 {current_user_name}님의 보고서")
             with st.expander("📝 새 보고서 작성하기", expanded=True):
@@ -794,50 +1959,22 @@ def main():
                     
                     if st.form_submit_button("제출"):
                         new_r = pd.DataFrame([{"날짜": str(r_date), "작성자": current_user_name, "내용": r_content, "답변": ""}])
-                        save_data("reports", pd.concat([df_reports, new_r], ignore_index=True))
-                        st.success("제출 완료"); time.sleep(0.5); st.rerun()
+                        if save_data("reports", pd.concat([df_reports, new_r], ignore_index=True)):
+                            st.success("제출 완료"); time.sleep(0.5); st.rerun()
             st.divider()
             
-            my_reports = df_reports[df_reports["작성자"] == current_user_name].copy()
+            my_reports = df_reports[df_reports["작성자"] == current_user_name]
             
             if my_reports.empty: st.info("제출한 보고서가 없습니다.")
             else:
-                my_reports["날짜_dt"] = pd.to_datetime(my_reports["날짜"], errors='coerce')
+                my_reports = my_reports.assign(날짜_dt=pd.to_datetime(my_reports["날짜"], errors='coerce'))
                 my_reports_sorted = my_reports.sort_values(by="날짜_dt", ascending=False)
                 
                 for i, row in my_reports_sorted.iterrows():
-                    if st.session_state.get(f"edit_mode_{i}", False):
-                        with st.form(f"edit_form_{i}"):
-                            st.caption(f"📝 보고서 수정 (No.{i})")
-                            edit_date = st.date_input("날짜", pd.to_datetime(row['날짜']))
-                            edit_content = st.text_area("내용", row['내용'], height=150)
-                            c_save, c_cancel = st.columns(2)
-                            if c_save.form_submit_button("💾 수정 완료"):
-                                df_reports.at[i, '날짜'] = str(edit_date)
-                                df_reports.at[i, '내용'] = edit_content
-                                save_data("reports", df_reports)
-                                st.session_state[f"edit_mode_{i}"] = False
-                                st.success("수정되었습니다!"); time.sleep(0.5); st.rerun()
-                            if c_cancel.form_submit_button("취소"):
-                                st.session_state[f"edit_mode_{i}"] = False
-                                st.rerun()
-                    else:
-                        html_content = f"""<div class="report-card"><div class="report-header">🗓️ {row['날짜']} 제출</div><div class="report-content">{row['내용']}</div>"""
-                        if row['답변'] and str(row['답변']).strip() != "":
-                            html_content += f"""<div class="reply-box"><div class="reply-title">💌 목회자 피드백</div><div>{row['답변']}</div></div>"""
-                        html_content += "</div>"
-                        st.markdown(html_content, unsafe_allow_html=True)
-                        
-                        c_edit, c_del = st.columns([1, 4]) 
-                        with c_edit:
-                            if st.button("✏️ 수정", key=f"btn_edit_{i}"):
-                                st.session_state[f"edit_mode_{i}"] = True
-                                st.rerun()
-                        with c_del:
-                            if st.button("🗑️ 삭제", key=f"btn_del_{i}"):
-                                df_reports = df_reports.drop(i)
-                                save_data("reports", df_reports)
-                                st.success("삭제되었습니다."); time.sleep(0.5); st.rerun()
+                    draw_report_card(i, row)
+
+    elif sel_menu == "🔎 기록 검색":
+        draw_text_search_tab(current_user, is_admin, is_viewer)
 
     elif sel_menu == "👥 명단 관리":
         st.subheader("명단 관리")
@@ -855,10 +1992,14 @@ def main():
             my_gs = [g.strip() for g in str(current_user["담당소그룹"]).split(",") if g.strip()]
             target = df_members[df_members["소그룹"].isin(my_gs)]
             st.info(f"담당: {', '.join(my_gs)}")
+
+        mem_q = st.text_input("🔍 성도 검색", key="member_search", placeholder=SEARCH_PLACEHOLDER)
+        target = filter_members_by_search(df_members, target, mem_q)
+        if mem_q.strip(): st.caption(f"검색 결과 {len(target)}명 (저장 시 검색되지 않은 성도는 그대로 유지됩니다)")
         
         sort_option = st.radio("정렬 기준 선택", ["👨‍👩‍👧‍👦 가족끼리(기본)", "🔤 이름순", "🏘️ 소그룹순", "🎂 생일순(월일)", "👵 연령순(나이)"], horizontal=True)
         if not target.empty:
-            target = target.copy()
+            target = editable(target)
             if sort_option == "👨‍👩‍👧‍👦 가족끼리(기본)":
                 target["가족ID_정렬"] = pd.to_numeric(target["가족ID"], errors='coerce').fillna(99999)
                 target = target.sort_values(by=["가족ID_정렬", "이름"])
@@ -879,14 +2020,10 @@ def main():
         col_conf_mem = {"이름": st.column_config.TextColumn(pinned=True)}
         edited = st.data_editor(target, num_rows="dynamic", use_container_width=True, column_config=col_conf_mem)
         if st.button("저장"):
-            if is_admin or is_viewer: 
-                save_data("members", edited)
-            else:
-                my_gs = [g.strip() for g in str(current_user["담당소그룹"]).split(",") if g.strip()]
-                mask = df_members["소그룹"].isin(my_gs)
-                others = df_members[~mask]
-                save_data("members", pd.concat([others, edited], ignore_index=True))
-            st.success("저장 완료!"); st.rerun()
+            # 화면에 보이지 않은 행(다른 소그룹, 검색 제외)은 그대로 두고 보이던 행만 교체
+            others = df_members.drop(target.index)
+            if save_data("members", pd.concat([others, edited], ignore_index=True)):
+                st.success("저장 완료!"); st.rerun()
 
     # [NEW] 개발 로그 탭
     elif sel_menu == "🛠️ 개발 로그":
@@ -895,7 +2032,170 @@ def main():
     elif sel_menu == "🔐 계정 관리" and is_admin:
         st.subheader("계정 관리")
         e_users = st.data_editor(load_data("users"), num_rows="dynamic", use_container_width=True)
-        if st.button("저장"): save_data("users", e_users); st.success("완료"); st.rerun()
+        if st.button("저장") and save_data("users", e_users): st.success("완료"); st.rerun()
+
+# --- 5. 명령줄 작업 (화면 밖에서 정기 실행) ---
+# 예) python app.py nightly            (cron 등으로 매일 새벽 실행)
+#     python app.py compact --archive-before 2024-01-01 --church all   (출석 체크하는 시간에는 실행하지 말 것)
+SYSTEM_USER = {"이름": "system", "역할": "admin", "담당소그룹": ""}
+
+def cli_fetch(sheet_name):
+    """명령줄용 fetch_sheet: 실패하면 원인을 출력하고 None"""
+    try: return fetch_sheet(sheet_name)
+    except SheetError as e:
+        print(f"  ✗ {sheet_name}: {e}"); return None
+
+def job_validate(args):
+    """[v3.3] 방어막과 같은 기준으로 각 탭의 1행(제목 행)을 미리 점검"""
+    budget = get_request_budget()
+    problems = 0
+    for sheet_name, expected in EXPECTED_COLS.items():
+        # 점검만 하므로 없는 탭을 만들지 않음
+        try: ws = get_worksheet(sheet_name, create=False)
+        except SheetError as e:
+            print(f"  ✗ {sheet_name}: {e}"); problems += 1; continue
+        if not budget.acquire("read"):
+            print(f"  ✗ {sheet_name}: 구글 API 읽기 한도 초과"); problems += 1; continue
+        try: header = [str(h).strip() for h in ws.row_values(1)]
+        except gspread.exceptions.APIError as e:
+            budget.penalize("read")
+            print(f"  ✗ {sheet_name}: 구글 API 오류 ({e})"); problems += 1; continue
+        blanks = [i + 1 for i, h in enumerate(header) if not h]
+        dups = sorted({h for h in header if h and header.count(h) > 1})
+        missing = [c for c in expected if c not in header]
+        if blanks or dups:
+            problems += 1
+            print(f"  ✗ {sheet_name}: 빈 제목 열 {blanks or '-'} / 중복 제목 {dups or '-'}")
+        elif missing and header:
+            print(f"  △ {sheet_name}: 없는 열 {missing} (빈 값으로 채워 사용)")
+        else:
+            print(f"  ✓ {sheet_name}")
+    return 1 if problems else 0
+
+def job_warm(args):
+    """모든 탭을 읽어 사본을 저장 (구글 한도 초과 시 화면이 이 사본으로 대신 표시)"""
+    failed = 0
+    for sheet_name in EXPECTED_COLS:
+        df = cli_fetch(sheet_name)
+        if df is None: failed += 1; continue
+        if df.empty:
+            # 빈 사본은 만들지 않음 (한도 초과 때 화면이 실제 기록 대신 빈 표를 보여주게 됨)
+            print(f"  - {sheet_name}: 기록이 없어 사본을 만들지 않았습니다."); continue
+        version = data_version(df)
+        write_snapshot(f"sheet_{sheet_name}.parquet", lambda p: df.to_parquet(p, index=False), {f"sheet:{sheet_name}": version})
+        print(f"  ✓ {sheet_name}: {len(df)}행 (버전 {version})")
+    return 1 if failed else 0
+
+def job_aggregates(args):
+    """추세 집계와 기도제목/보고서 검색 색인을 미리 만들어 둠"""
+    df_att = cli_fetch("attendance_log")
+    if df_att is None: return 1
+    version = data_version(df_att)
+    cube = build_attendance_cube(df_att)
+    write_snapshot("attendance_cube.parquet", lambda p: cube.to_parquet(p, index=False), {"attendance_cube.parquet:attendance_log": version})
+    print(f"  ✓ 출석 집계: {len(cube)}칸 (버전 {version})")
+    for sheet_name in TEXT_SEARCH_SOURCES.values():
+        df = cli_fetch(sheet_name)
+        if df is None: continue
+        index = get_text_index(sheet_name)
+        index.sync(df, data_version(df))
+        def dump(p, index=index):
+            with open(p, "wb") as f: pickle.dump(index, f)
+        write_snapshot(f"text_index_{sheet_name}.pkl", dump, {f"text_index_{sheet_name}.pkl:{sheet_name}": index.version})
+        print(f"  ✓ {sheet_name} 검색 색인: 글 {len(index.doc_grams)}개")
+    return 0
+
+def job_compact(args):
+    """출석 기록 중복 제거 + (선택) 기준일 이전 기록을 attendance_archive 탭으로 이동
+    화면의 저장과 잠금을 공유하지 않는 별도 프로세스이므로, 출석을 체크하는 시간(주일 예배 전후 등)에는 실행하지 말 것"""
+    df = cli_fetch("attendance_log")
+    if df is None: return 1
+    keep = df.drop_duplicates(subset=["날짜", "모임명", "이름"])
+    old = keep.iloc[0:0]
+    if args.archive_before:
+        is_old = pd.to_datetime(keep["날짜"], errors='coerce') < pd.Timestamp(args.archive_before)
+        old, keep = keep[is_old], keep[~is_old]
+    print(f"  전체 {len(df)}행 → 중복 {len(df) - len(old) - len(keep)}행 제거, 보관 이동 {len(old)}행, 남김 {len(keep)}행")
+    if len(keep) == len(df) or args.dry_run: return 0
+
+    budget = get_request_budget()
+    try: ws = get_worksheet("attendance_log")
+    except SheetError as e:
+        print(f"  ✗ attendance_log: {e}"); return 1
+    # 읽은 뒤 누군가 출석을 저장했다면(행 수가 달라졌다면) 덮어쓰지 않고 중단
+    if not budget.acquire("read", max_wait=QUOTA_MAX_WAIT_WRITE) or len(ws.col_values(1)) != len(df) + 1:
+        print("  ✗ 읽는 동안 출석부가 바뀌었거나 확인하지 못했습니다. 출석 체크가 없는 시간에 다시 실행해주세요."); return 1
+    if not old.empty:
+        # 보관 탭에 먼저 붙여 넣고 나서 원본을 줄임 (중간에 실패해도 기록이 사라지지 않음)
+        ws_archive = get_worksheet("attendance_archive")
+        if not ws_archive or not budget.acquire("write", 2, max_wait=QUOTA_MAX_WAIT_WRITE):
+            print("  ✗ attendance_archive 탭에 쓸 수 없습니다."); return 1
+        if not ws_archive.row_values(1): ws_archive.append_row(old.columns.tolist())
+        ws_archive.append_rows(old.values.tolist())
+    if not budget.acquire("write", 2, max_wait=QUOTA_MAX_WAIT_WRITE):
+        print("  ✗ attendance_log 탭에 쓸 수 없습니다."); return 1
+    # 지우고 다시 쓰지 않고, 정리된 기록을 위에서부터 덮어쓴 뒤 남는 아래쪽 행만 삭제 (중간에 실패해도 기록이 통째로 사라지지 않음)
+    ws.update(range_name='A1', values=[keep.columns.tolist()] + keep.values.tolist())
+    ws.delete_rows(len(keep) + 2, len(df) + 1)
+    print("  ✓ 정리 완료")
+    return 0
+
+def job_summary(args):
+    """지정한 날짜가 속한 주(일~토)의 소그룹 x 모임 출석 요약표를 CSV로 저장"""
+    base_date = datetime.date.fromisoformat(args.week) if args.week else datetime.date.today() - datetime.timedelta(days=7)
+    sun, sat = get_week_range(base_date)
+    rows = pd.concat(list(iter_export_rows("출석 기록", sun, sat, SYSTEM_USER)), ignore_index=True)
+    if rows.empty:
+        table = pd.DataFrame()
+    else:
+        table = pd.crosstab(rows["소그룹"], rows["모임명"], margins=True, margins_name="합계")
+        order = get_meeting_config()["ordered"]
+        table = table[[c for c in order if c in table.columns] + [c for c in table.columns if c not in order]]
+    name = f"weekly/{sun.strftime('%Y-%m-%d')}.csv"
+    write_snapshot(name, lambda p: table.to_csv(p, encoding="utf-8-sig"))
+    print(f"  ✓ {sun} ~ {sat} 요약: {snapshot_path(name)}")
+    return 0
+
+def job_nightly(args):
+    code = job_validate(args)
+    if code: return code
+    return max(job_warm(args), job_aggregates(args), job_summary(args))
+
+CLI_JOBS = {
+    "validate": (job_validate, "시트 제목 행 점검"),
+    "warm": (job_warm, "시트 사본 저장"),
+    "aggregates": (job_aggregates, "추세 집계/검색 색인 미리 만들기"),
+    "compact": (job_compact, "출석 기록 중복 제거 및 오래된 기록 보관"),
+    "summary": (job_summary, "주간 요약 CSV 만들기"),
+    "nightly": (job_nightly, "validate → warm → aggregates → summary"),
+}
+
+def run_cli(argv):
+    global TENANT_OVERRIDE
+    parser = argparse.ArgumentParser(prog="python app.py", description="출석부 정기 작업 (화면 없이 실행)")
+    parser.add_argument("job", choices=list(CLI_JOBS), help=" / ".join(f"{k}: {v[1]}" for k, v in CLI_JOBS.items()))
+    parser.add_argument("--church", help="교회코드 (all = 모든 교회, 생략 시 첫 번째 교회)")
+    parser.add_argument("--week", help="summary: 기준 날짜 YYYY-MM-DD (생략 시 지난주)")
+    parser.add_argument("--archive-before", help="compact: 이 날짜 이전 기록을 보관 탭으로 이동 YYYY-MM-DD (출석 체크 시간에는 실행 금지)")
+    parser.add_argument("--dry-run", action="store_true", help="compact: 바꾸지 않고 결과만 출력")
+    args = parser.parse_args(argv)
+
+    registry = get_tenant_registry()
+    tenant_ids = list(registry) if args.church == "all" else [args.church or next(iter(registry))]
+    code = 0
+    for tid in tenant_ids:
+        if tid not in registry:
+            print(f"알 수 없는 교회코드: {tid}"); code = 2; continue
+        TENANT_OVERRIDE = tid
+        print(f"[{registry[tid]['name']}] {args.job}")
+        t0 = time.perf_counter()
+        try: code = max(code, CLI_JOBS[args.job][0](args))
+        except (SheetError, gspread.exceptions.APIError) as e:
+            # 한 교회에서 실패해도 --church all 의 나머지 교회는 계속 진행
+            print(f"  ✗ {e}"); code = max(code, 1)
+        print(f"  ({time.perf_counter() - t0:.1f}초)")
+    return code
 
 if __name__ == "__main__":
-    main()
+    if runtime.exists(): main()
+    else: sys.exit(run_cli(sys.argv[1:]))
@@ -0,0 +1,55 @@
+# 시작 속도 측정: python bench.py > bench_output.txt
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "gspread", "oauth2client.service_account", "extra_streamlit_components", "korean_lunar_calendar"]
+
+def run(code):
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    lines = out.stdout.strip().splitlines()
+    if out.returncode != 0 or not lines:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "no output")
+    return json.loads(lines[-1])
+
+def bench_module_import(name):
+    return run(f"""
+import json, time
+t0 = time.perf_counter()
+import {name}
+print(json.dumps(time.perf_counter() - t0))
+""")
+
+def bench_app_startup():
+    # streamlit 없이 실행(bare mode)하여 app 모듈 로딩 ~ 첫 화면(제목)까지 시간을 잼
+    return run(f"""
+import json, sys, time
+t0 = time.perf_counter()
+import app
+imported = time.perf_counter() - t0
+loaded_heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+try: app.main()
+except BaseException: pass
+print(json.dumps({{"import_app": imported, "heavy_loaded_on_import": loaded_heavy, "timings": app.STARTUP_TIMINGS}}))
+""")
+
+def main():
+    print("== 모듈별 import 시간 (각각 새 프로세스) ==")
+    for name in ["streamlit"] + HEAVY_MODULES:
+        try: print(f"{name:32s} {bench_module_import(name) * 1000:8.1f} ms")
+        except RuntimeError as e: print(f"{name:32s} 실패 ({e})")
+
+    print("\n== app.py 시작 ==")
+    try: result = bench_app_startup()
+    except RuntimeError as e:
+        print(f"실패 ({e})"); return
+    print(f"{'import app':32s} {result['import_app'] * 1000:8.1f} ms")
+    print(f"{'import 시 로드된 무거운 모듈':32s} {', '.join(result['heavy_loaded_on_import']) or '없음'}")
+    timings = result["timings"]
+    for label in ["first_paint", "login_box"]:
+        if label in timings: print(f"{label + ' (시작 후)':32s} {timings[label] * 1000:8.1f} ms")
+    for label, sec in timings.items():
+        if label.startswith("import "): print(f"{label + ' (지연 로드)':32s} {sec * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()